@@ -1 +1 @@
-__all__ = ["colorschemes", "driver"]
+__all__ = ["benchmark", "colorschemes", "driver"]
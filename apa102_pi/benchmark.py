@@ -0,0 +1,135 @@
+"""Benchmarks for the driver and the colour schemes.
+
+Everything runs against a NullTransport, so no LEDs (and no Raspberry Pi) are needed.
+The results are printed as a table, and can be written to a JSON file, so that the
+numbers of two releases can be compared:
+
+    python -m apa102_pi.benchmark --output results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from apa102_pi.colorschemes import colorschemes
+from apa102_pi.driver import apa102
+from apa102_pi.driver import transport
+
+SIZES = [8, 64, 300, 1024, 4096]
+EFFECTS = [colorschemes.StrandTest, colorschemes.TheaterChase, colorschemes.RoundAndRound,
+           colorschemes.Solid, colorschemes.Rainbow]
+STEPS_PER_CYCLE = 35  # A multiple of 7, see TheaterChase
+
+
+def driver_cases(strip):
+    """Returns the driver benchmarks for strip: A name, and a function that renders one frame."""
+    num_led = strip.num_led
+
+    def set_pixel():
+        for led in range(num_led):
+            strip.set_pixel(led, 255, 128, 0)
+
+    def set_pixel_rgb():
+        for led in range(num_led):
+            strip.set_pixel_rgb(led, 0xFF8000)
+
+    def rotate():
+        strip.rotate()
+
+    def show():
+        strip.show(force=True)
+
+    return [('set_pixel', set_pixel), ('set_pixel_rgb', set_pixel_rgb), ('rotate', rotate), ('show', show)]
+
+
+def effect_case(effect_class, strip):
+    """Returns the benchmark of one effect: One step of update, followed by show."""
+    num_led = strip.num_led
+    effect = effect_class(num_led=num_led, num_steps_per_cycle=STEPS_PER_CYCLE)
+    effect.init(strip, num_led)
+    position = [0, 0]  # current_step and current_cycle
+
+    def update():
+        if effect.update(strip, num_led, STEPS_PER_CYCLE, position[0], position[1]):
+            strip.show()
+        position[0] += 1
+        if position[0] == STEPS_PER_CYCLE:
+            position[0] = 0
+            position[1] += 1
+
+    return effect_class.__name__, update
+
+
+def measure(frame, null_transport, min_time):
+    """Runs frame repeatedly for at least min_time seconds. Returns the measurements.
+
+    peak_bytes_per_frame is the memory a frame needs at its peak, above what was in use
+    before (as traced by tracemalloc), averaged over a few frames. It is not a number of
+    allocations: A frame that allocates and frees a buffer many times counts it once.
+    """
+    frame()  # Warm up, e.g. to build lookup tables
+    bytes_before = null_transport.bytes_sent
+    frames = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        frame()
+        frames += 1
+        elapsed = time.perf_counter() - started
+    bytes_sent = null_transport.bytes_sent - bytes_before
+    # Memory needed to render a frame: The peak above what was in use before
+    tracemalloc.start()
+    peak = 0
+    samples = min(frames, 10)
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        in_use = tracemalloc.get_traced_memory()[0]
+        frame()
+        peak += tracemalloc.get_traced_memory()[1] - in_use
+    tracemalloc.stop()
+    return {'frames': frames, 'seconds': elapsed, 'frames_per_sec': frames / elapsed,
+            'bytes_per_sec': bytes_sent / elapsed, 'peak_bytes_per_frame': peak / samples}
+
+
+def run(sizes=None, min_time=0.5):
+    """Runs all benchmarks. Returns a list with one dictionary per benchmark and strip length."""
+    results = []
+    for num_led in sizes or SIZES:
+        cases = []
+        null_transport = transport.NullTransport()
+        strip = apa102.APA102(num_led=num_led, transport=null_transport)
+        cases += [(name, frame, null_transport) for name, frame in driver_cases(strip)]
+        for effect_class in EFFECTS:
+            null_transport = transport.NullTransport()
+            strip = apa102.APA102(num_led=num_led, transport=null_transport)
+            cases.append(effect_case(effect_class, strip) + (null_transport,))
+        for name, frame, null_transport in cases:
+            result = {'case': name, 'num_led': num_led}
+            result.update(measure(frame, null_transport, min_time))
+            results.append(result)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the APA102 driver and colour schemes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Strip lengths to benchmark")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Seconds to run each benchmark")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args(args)
+
+    results = run(args.sizes, args.min_time)
+    print('%-14s %6s %12s %14s %14s' % ('case', 'leds', 'frames/s', 'bytes/s', 'peak B/frame'))
+    for result in results:
+        print('%-14s %6d %12.1f %14.0f %14.0f' % (result['case'], result['num_led'], result['frames_per_sec'],
+                                                  result['bytes_per_sec'], result['peak_bytes_per_frame']))
+    if args.output:
+        report = {'python': sys.version, 'platform': platform.platform(), 'time': time.time(),
+                  'results': results}
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
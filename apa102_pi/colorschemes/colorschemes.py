@@ -1,4 +1,6 @@
 """This module contains a few concrete colour cycles to play with"""
+import operator
+from itertools import repeat
 
 from apa102_pi.driver import colorcycletemplate
 
@@ -35,6 +37,8 @@ class StrandTest(colorcycletemplate.ColorCycleTemplate):
 class TheaterChase(colorcycletemplate.ColorCycleTemplate):
     """Runs a 'marquee' effect around the strip."""
 
+    periodic = True  # The frames only depend on current_step
+
     def update(self, strip, num_led, num_steps_per_cycle, current_step,
                current_cycle):
         # One cycle = One trip through the color wheel, 0..254
@@ -44,13 +48,11 @@ class TheaterChase(colorcycletemplate.ColorCycleTemplate):
         start_index = current_step % 7  # One segment is 2 blank, and 5 filled
         color_index = strip.wheel(int(round(255 / num_steps_per_cycle *
                                             current_step, 0)))
-        for pixel in range(num_led):
-            # Two LEDs out of 7 are blank. At each step, the blank
-            # ones move one pixel ahead.
-            if ((pixel + start_index) % 7 == 0) or ((pixel + start_index) % 7 == 1):
-                strip.set_pixel_rgb(pixel, 0)
-            else:
-                strip.set_pixel_rgb(pixel, color_index)
+        # Two LEDs out of 7 are blank. At each step, the blank
+        # ones move one pixel ahead.
+        segment = bytes(6) + color_index.to_bytes(3, 'big') * 5
+        segment = segment[3 * start_index:] + segment[:3 * start_index]
+        strip.set_pixels(segment * (num_led // 7 + 1))
         return 1
 
 
@@ -72,6 +74,8 @@ class RoundAndRound(colorcycletemplate.ColorCycleTemplate):
 class Solid(colorcycletemplate.ColorCycleTemplate):
     """Paints the strip with one colour."""
 
+    periodic = True  # The frames only depend on current_step
+
     def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
         stripcolour = 0xFFFFFF
         if current_step == 1:
@@ -80,14 +84,16 @@ class Solid(colorcycletemplate.ColorCycleTemplate):
             stripcolour = 0x00FF00
         if current_step == 3:
             stripcolour = 0x0000FF
-        for led in range(0, num_led):
-            strip.set_pixel_rgb(led, stripcolour, 5)  # Paint 5% white
+        strip.fill(stripcolour, 5)  # Paint 5% white
         return 1
 
 
 class Rainbow(colorcycletemplate.ColorCycleTemplate):
     """Paints a rainbow effect across the entire strip."""
 
+    periodic = True  # The frames only depend on current_step
+    led_offsets = None  # Distance of each LED from LED 0 on the wheel; The same for every step
+
     def update(self, strip, num_led, num_steps_per_cycle, current_step,
                current_cycle):
         # One cycle = One trip through the color wheel, 0..254
@@ -101,12 +107,12 @@ class Rainbow(colorcycletemplate.ColorCycleTemplate):
         #     number of LEDs
         scale_factor = 255 / num_led  # Index change between two neighboring LEDs
         start_index = 255 / num_steps_per_cycle * current_step  # LED 0
-        for i in range(num_led):
-            # Index of LED i, not rounded and not wrapped at 255
-            led_index = start_index + i * scale_factor
-            # Now rounded and wrapped
-            led_index_rounded_wrapped = int(round(led_index, 0)) % 255
-            # Get the actual color out of the wheel
-            pixel_color = strip.wheel(led_index_rounded_wrapped)
-            strip.set_pixel_rgb(i, pixel_color)
+        if self.led_offsets is None or len(self.led_offsets) != num_led:
+            self.led_offsets = [i * scale_factor for i in range(num_led)]
+        # Index of each LED, not rounded and not wrapped at 255
+        led_indexes = map(start_index.__add__, self.led_offsets)
+        # Now rounded and wrapped
+        led_indexes_rounded_wrapped = map(operator.mod, map(round, led_indexes), repeat(255))
+        # Get the actual colors out of the precomputed wheel, and copy them all into the buffer in one go
+        strip.set_pixels_wheel(led_indexes_rounded_wrapped)
         return 1  # All pixels are set in the buffer, so repaint the strip now
@@ -1 +1,3 @@
-__all__ = ["apa102", "colorcycletemplate"]
+__all__ = ["animation", "apa102", "asyncapa102", "bytemath", "colorcycletemplate", "compositor", "correction",
+           "framecache", "framescheduler", "framestats", "ingest", "matrix", "multistrip", "showfile",
+           "transport"]
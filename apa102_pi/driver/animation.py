@@ -0,0 +1,167 @@
+"""The module contains an animation engine that tweens between keyframes"""
+import colorsys
+import time
+from bisect import bisect_right
+
+from apa102_pi.driver import bytemath
+from apa102_pi.driver import framescheduler
+
+INTERPOLATIONS = ['rgb', 'hsv']
+
+
+def ease_in(position):
+    """Starts slowly, and speeds up towards the end (quadratic)."""
+    return position * position
+
+
+def ease_out(position):
+    """Starts fast, and slows down towards the end (quadratic)."""
+    return position * (2.0 - position)
+
+
+def ease_in_out(position):
+    """Starts and ends slowly, and is fastest in the middle (smoothstep)."""
+    return position * position * (3.0 - 2.0 * position)
+
+
+EASINGS = {'linear': lambda position: position, 'ease-in': ease_in, 'ease-out': ease_out,
+           'ease-in-out': ease_in_out}
+
+
+def hsv_frame(first, second, position):
+    """Returns the colors between two frames (RGB bytes) at position (0.0 to 1.0), interpolated in HSV.
+
+    The hue takes the shorter way around the color wheel. This runs per pixel, see Animation.
+    """
+    frame = bytearray(len(first))
+    for index in range(0, len(first), 3):
+        hue1, saturation1, value1 = colorsys.rgb_to_hsv(*[channel / 255.0 for channel in first[index:index + 3]])
+        hue2, saturation2, value2 = colorsys.rgb_to_hsv(*[channel / 255.0 for channel in second[index:index + 3]])
+        # A gray pixel has no hue of its own: Take the one of the other side, so that only the saturation fades
+        if saturation1 == 0:
+            hue1 = hue2
+        if saturation2 == 0:
+            hue2 = hue1
+        distance = (hue2 - hue1 + 0.5) % 1.0 - 0.5
+        rgb = colorsys.hsv_to_rgb((hue1 + distance * position) % 1.0,
+                                  saturation1 + (saturation2 - saturation1) * position,
+                                  value1 + (value2 - value1) * position)
+        frame[index:index + 3] = bytes(int(round(channel * 255)) for channel in rgb)
+    return bytes(frame)
+
+
+class Animation:
+    """Plays a sequence of keyframes on a strip, with smooth transitions in between.
+
+    A keyframe is the color of every LED (3 bytes red, green and blue per LED, as for
+    set_pixels) at a point in time. In between two keyframes, the colors are interpolated,
+    for all LEDs at once (see module bytemath): Every frame costs a few operations on large
+    integers, and one set_pixels, for any number of LEDs.
+
+    The transition to a keyframe can be eased (see EASINGS), and interpolated in RGB or
+    in HSV. HSV goes around the color wheel instead of through gray, but cannot be computed
+    in bulk. Therefore, hsv_steps frames of the transition are computed once per pixel, and
+    the frames in between are interpolated in RGB from these.
+    """
+
+    def __init__(self, strip, loop=False, hsv_steps=32):
+        """Initializes the animation
+
+        :param strip: The strip to play on
+        :param loop: Start over after the last keyframe. For a seamless loop, the last keyframe should
+                     have the same colors as the first one.
+        :param hsv_steps: Number of precomputed frames of an HSV transition
+        """
+        if hsv_steps <= 0:
+            raise ValueError("Illegal hsv_steps must be greater than 0")
+        self.strip = strip
+        self.loop = loop
+        self.hsv_steps = hsv_steps
+        self.count = 3 * strip.num_led  # Bytes per keyframe
+        self.times = []
+        self.keyframes = []  # Per keyframe: Pixels, the pixels as lanes, easing and interpolation
+        self.hsv_cache = {}  # Precomputed frames (as lanes) of the HSV transitions, by keyframe index
+
+    @property
+    def duration(self):
+        """Time of the last keyframe."""
+        if not self.times:
+            return 0.0
+        return self.times[-1]
+
+    def add_keyframe(self, at, pixels, easing='linear', interpolation='rgb'):
+        """Adds a keyframe
+
+        :param at: Time of the keyframe in seconds from the start of the animation
+        :param pixels: The colors of the strip, see set_pixels
+        :param easing: Easing of the transition to this keyframe, see EASINGS
+        :param interpolation: Interpolation of the transition to this keyframe, rgb or hsv
+        """
+        pixels = bytes(pixels)
+        if len(pixels) != self.count:
+            raise ValueError("Illegal pixels must contain %d bytes" % self.count)
+        if easing not in EASINGS:
+            raise ValueError("Illegal easing not in %s" % list(EASINGS))
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError("Illegal interpolation not in %s" % INTERPOLATIONS)
+        index = bisect_right(self.times, at)
+        self.times.insert(index, at)
+        self.keyframes.insert(index, (pixels, bytemath.lanes(pixels), EASINGS[easing], interpolation))
+        self.hsv_cache.clear()  # The neighbours changed
+
+    def frame_at(self, at):
+        """Returns the colors of the strip at a time, as bytes."""
+        if not self.times:
+            raise ValueError("Illegal animation without keyframes")
+        if self.loop and self.duration > 0:
+            at %= self.duration
+        index = bisect_right(self.times, at)  # Index of the next keyframe
+        if index == 0:
+            return self.keyframes[0][0]  # Before the start
+        if index == len(self.times):
+            return self.keyframes[-1][0]  # After the end
+        start, end = self.times[index - 1], self.times[index]
+        previous = self.keyframes[index - 1]
+        _, pixel_lanes, easing, interpolation = self.keyframes[index]
+        position = easing((at - start) / (end - start))
+        if interpolation == 'rgb':
+            return bytemath.mix(previous[1], pixel_lanes, int(round(position * 256)), self.count)
+        # HSV: Interpolate in RGB between the two nearest precomputed frames
+        steps = self.hsv_transition(index)
+        step, weight = divmod(int(round(position * self.hsv_steps * 256)), 256)
+        if step >= self.hsv_steps:
+            step, weight = self.hsv_steps - 1, 256
+        return bytemath.mix(steps[step], steps[step + 1], weight, self.count)
+
+    def hsv_transition(self, index):
+        """Internal method: Returns the precomputed frames (as lanes) of the HSV transition to a keyframe"""
+        steps = self.hsv_cache.get(index)
+        if steps is None:
+            first, second = self.keyframes[index - 1][0], self.keyframes[index][0]
+            steps = [bytemath.lanes(hsv_frame(first, second, step / self.hsv_steps))
+                     for step in range(self.hsv_steps + 1)]
+            self.hsv_cache[index] = steps
+        return steps
+
+    def render(self, at):
+        """Writes the colors at a time into the pixel buffer of the strip. Call show to send them."""
+        self.strip.set_pixels(self.frame_at(at))
+
+    def play(self, fps=50, duration=None):
+        """Plays the animation at a steady frame rate
+
+        :param fps: Frames per second
+        :param duration: Seconds to play. Default is the duration of the animation, or forever with loop.
+        """
+        if duration is None and not self.loop:
+            duration = self.duration
+        scheduler = framescheduler.FrameScheduler(fps)
+        scheduler.start()
+        started = time.monotonic()
+        while True:
+            at = time.monotonic() - started
+            self.render(at if duration is None else min(at, duration))
+            self.strip.show()
+            if duration is not None and at >= duration:
+                return
+            scheduler.wait()
@@ -1,18 +1,44 @@
 """This is the main driver module for APA102 LEDs"""
+from itertools import repeat
 from math import ceil
 import logging
+import operator
+import queue
+import threading
+import time
 
-import adafruit_bitbangio as bitbangio
-import board
-import busio
-import digitalio
-from adafruit_bus_device.spi_device import SPIDevice
-from microcontroller.pin import spiPorts
+from apa102_pi.driver import correction
+from apa102_pi.driver import transport as transports
 
 RGB_MAP = {'rgb': [3, 2, 1], 'rbg': [3, 1, 2], 'grb': [2, 3, 1],
            'gbr': [2, 1, 3], 'brg': [1, 3, 2], 'bgr': [1, 2, 3]}
 
 
+def color_buffer(pixels):
+    """Returns pixels (anything that supports the buffer protocol) as a flat memoryview of bytes."""
+    colors = memoryview(pixels)
+    if not colors.c_contiguous:
+        colors = memoryview(colors.tobytes())
+    if colors.itemsize != 1:
+        raise ValueError("Illegal pixels must contain one byte per color")
+    return colors.cast('B')
+
+
+def wheel_color(wheel_pos):
+    """Compute a color of the color wheel; Green -> Red -> Blue -> Green"""
+
+    if wheel_pos > 255:
+        wheel_pos = 255  # Safeguard
+    if wheel_pos < 85:  # Green -> Red
+        return APA102.combine_color(wheel_pos * 3, 255 - wheel_pos * 3, 0)
+    if wheel_pos < 170:  # Red -> Blue
+        wheel_pos -= 85
+        return APA102.combine_color(255 - wheel_pos * 3, 0, wheel_pos * 3)
+    # Blue -> Green
+    wheel_pos -= 170
+    return APA102.combine_color(0, wheel_pos * 3, 255 - wheel_pos * 3)
+
+
 class APA102:
     """
     Driver for APA102 LEDS (aka "DotStar").
@@ -22,15 +48,26 @@ class APA102:
     Public methods are:
      - set_pixel
      - set_pixel_rgb
+     - set_pixels
+     - set_range
+     - set_pixels_wheel
+     - set_pixels_hdr
+     - set_led_frames
+     - fill
      - get_pixel
      - get_pixel_rgb
      - show
+     - encoded_frame
+     - show_frame
+     - flush
      - clear_strip
      - cleanup
 
     Helper methods for color manipulation are:
      - combine_color
      - wheel
+     - wheel_frames
+     - led_frame
 
     The rest of the methods are used internally and should not be used by the
     user of the library. This file is the main driver, and is usually used "as is".
@@ -79,90 +116,110 @@ class APA102:
     LED_START = 0b11100000  # Three "1" bits, followed by 5 brightness bits
 
     def __init__(self, num_led=8, order='rgb', bus_method='spi', spi_bus=0, mosi=None, sclk=None, ce=None,
-                 bus_speed_hz=8000000, global_brightness=4):
+                 bus_speed_hz=8000000, global_brightness=4, max_transfer=None, skip_unchanged=False,
+                 partial_update=False, threaded=False, queue_depth=2, lock_timeout=None, transport=None,
+                 stats=None, gamma=None, white_balance=None, color_temperature=None, dither=False,
+                 dither_min_fps=100):
         """Initializes the library
 
         :param num_led: Number of LEDs in the strip
         :param order: Order in which the colours are addressed (this differs from strip to strip)
-        :param bus_method: select whether to use the (hardware) spi or to bitbang
+        :param bus_method: select whether to use the (hardware) spi or to bitbang. Two more methods exist:
+                   spidev uses hardware SPI through the kernel driver directly, null sends nowhere (see
+                   transport.NullTransport)
         :param spi_bus: if bus_method is spi this selects the bus
         :param mosi: if bus_method is bitbang this sets the Master Out pin.
         :param sclk: if bus_method is bitbang this sets the Clock pin.
         :param ce: GPIO to use for Chip select. Can be any free GPIO pin. Warning: This will slow down the bus
-                   significantly. Note: The hardware CE0 and CE1 are not used
+                   significantly. Note: The hardware CE0 and CE1 are not used. Not supported by spidev, which
+                   always toggles CE0.
         :param bus_speed_hz: Speed of the hardware SPI bus. If glitches on the bus are visible, lower the value.
         :param global_brightness: This is a 5 bit value, i.e. from 0 to 31.
+        :param max_transfer: Largest number of bytes written to the SPI device at once. Longer frames are split
+                   into several writes. Default is the buffer size of the spidev kernel driver.
+        :param skip_unchanged: If true, show does nothing unless the pixel buffer changed since the last show.
+        :param partial_update: If true, show only clocks out the LEDs up to the last changed one. Implies
+                   skip_unchanged.
+        :param threaded: If true, frames are sent to the strip by a background thread, and show returns right away.
+        :param queue_depth: With threaded, how many frames can be on their way to the strip. If the thread falls
+                   behind, show waits until a frame is sent.
+        :param lock_timeout: How many seconds to wait for the bus lock before giving up with a TimeoutError.
+                   Default is to wait forever. Not supported by spidev, which has no bus lock.
+        :param transport: A transport object (see module transport) to send the frames with. If set, the bus
+                   parameters above are ignored.
+        :param stats: A framestats.FrameStats object to record the time spent in show. Default is no statistics.
+        :param gamma: Gamma correction of the colors, e.g. 2.2. Default is no correction. See set_correction.
+        :param white_balance: Factors (0.0 to 1.0) for red, green and blue, to balance the white of the LEDs.
+        :param color_temperature: Tint the colors to this color temperature in Kelvin (6600 is neutral).
+        :param dither: If true, show the fractions of the corrected colors with temporal dithering, see dithering.
+        :param dither_min_fps: Only dither while show is called at least this many times per second.
         """
 
-        logging.basicConfig(level=logging.DEBUG)
-        spi_ports = {}
-        for id_port, sclk_port, mosi_port, miso_port in spiPorts:
-            spi_ports[id_port] = {'SCLK': sclk_port, 'MOSI': mosi_port, 'MISO': miso_port}
-
         # Just in case someone use CAPS here.
         order = order.lower()
         bus_method = bus_method.lower()
 
-        self.check_input(bus_method, global_brightness, mosi, num_led, order, sclk, spi_bus, spi_ports)
+        self.check_input(bus_method, global_brightness, mosi, num_led, order, sclk, spi_bus)
 
         self.num_led = num_led
         self.rgb = RGB_MAP.get(order, RGB_MAP['rgb'])
         self.global_brightness = global_brightness
-        self.use_bitbang = False  # Two raw SPI devices exist: Bitbang (software) and hardware SPI.
-        self.use_ce = False  # If true, use the BusDevice abstraction layer on top of the raw SPI device
-
-        self.leds = [self.LED_START, 0, 0, 0] * self.num_led  # Pixel buffer
-
-        if bus_method == 'spi':
-            selected = spi_ports[spi_bus]
-            self.spi = busio.SPI(clock=selected['SCLK'], MOSI=selected['MOSI'])
-
-        elif bus_method == 'bitbang':
-            self.spi = bitbangio.SPI(clock=eval("board.D" + str(sclk)), MOSI=eval("board.D" + str(mosi)))
-            self.use_bitbang = True
-
-        if ce is not None:
-            # If a chip enable value is present, use the Adafruit CircuitPython BusDevice abstraction on top
-            # of the raw SPI device (hardware or bitbang)
-            # The next line is just here to prevent an "unused" warning from the IDE
-            digitalio.DigitalInOut(board.D1)
-            # Convert the chip enable pin number into an object (reflection à la Python)
-            ce = eval("digitalio.DigitalInOut(board.D" + str(ce) + ")")
-            self.use_ce = True
-
-        # Add the BusDevice on top of the raw SPI
-        if self.use_ce:
-            self.spibus = SPIDevice(spi=self.spi, chip_select=ce, baudrate=bus_speed_hz)
-        else:
-            # If the BusDevice is not used, the bus speed is set here instead
-            while not self.spi.try_lock():
-                # Busy wait to acquire the lock
-                pass
-            self.spi.configure(baudrate=bus_speed_hz)
-            self.spi.unlock()
-        # Debug
-        if self.use_ce:
-            logging.debug("Use software chip enable")
-        if self.use_bitbang:
-            logging.debug("Use bitbang SPI")
-        else:
-            logging.debug("Use hardware SPI")
+        self.build_tables()
+
+        # Transmit buffer: Start frame, pixels, reset frame and end frame, sent to the strip in one go
+        self.frame = bytearray(4 + 4 * self.num_led + 4 + self.end_frame_length(self.num_led))
+        # Pixel buffer: A zero-copy view on the pixel part of the transmit buffer, 4 bytes per LED
+        self.leds = memoryview(self.frame)[4:4 + 4 * self.num_led]
+        self.leds[0::4] = bytes([self.LED_START]) * self.num_led
+        # Changed LEDs since the last show: From dirty_low up to, but not including, dirty_high.
+        # The state of the strip is unknown at this point, so everything counts as changed.
+        self.dirty_low = 0
+        self.dirty_high = self.num_led
+        self.offset = 0  # Position of LED 0 in the pixel buffer, see rotate
+        self.skip_unchanged = skip_unchanged or partial_update
+        self.partial_update = partial_update
+        # Corrected copy of the transmit buffer. Only used if a correction is set, see set_correction
+        self.corrected_frame = None
+        self.correction_tables = None
+        self.dither_tables = None
+        self.dither = dither
+        self.dither_min_fps = dither_min_fps
+        # Remainders of the dithered colors, one byte per byte of the pixel buffer. The start values differ
+        # from LED to LED, so that LEDs of the same color do not all step up in the same frame.
+        self.dither_error = bytearray((position * 151) & 0xFF for position in range(4 * self.num_led))
+        self.last_show = None
+        self.frame_interval = None  # Average time between two shows, see dithering
+        self.set_correction(gamma, white_balance, color_temperature)
+
+        if transport is None:
+            transport = transports.create(bus_method, spi_bus, mosi, sclk, ce, bus_speed_hz, lock_timeout,
+                                          max_transfer)
+        self.transport = transport
+        self.stats = stats
+        # Background transmit: A pool of transmit buffers, and a queue of frames waiting to be sent
+        self.transmit_thread = None
+        self.transmit_error = None
+        if threaded:
+            if queue_depth < 1:
+                raise ValueError("Illegal queue_depth min 1")
+            self.free_buffers = queue.Queue()
+            for _ in range(queue_depth):
+                self.free_buffers.put(bytearray(len(self.frame)))
+            self.pending_frames = queue.Queue()
+            self.transmit_thread = threading.Thread(target=self.transmit_worker, name='apa102-transmit', daemon=True)
+            self.transmit_thread.start()
 
     @staticmethod
-    def check_input(bus_method, global_brightness, mosi, num_led, order, sclk, spi_bus, spi_ports):
+    def check_input(bus_method, global_brightness, mosi, num_led, order, sclk, spi_bus):
         """
         Checks the input values for validity
 1       """
         if num_led <= 0:
             raise ValueError("Illegal num_led can not be 0 or less")
-        if num_led > 1024:
-            raise ValueError("Illegal num_led only supported upto 1024 leds")
         if order not in RGB_MAP:
             raise ValueError("Illegal order not in %s" % list(RGB_MAP.keys()))
-        if bus_method not in ['spi', 'bitbang']:
-            raise ValueError("Illegal bus_method use spi or bitbang")
-        if bus_method == 'spi' and spi_bus not in spi_ports:
-            raise ValueError("Illegal spi_bus not in %s" % list(spi_ports))
+        if bus_method not in transports.BUS_METHODS:
+            raise ValueError("Illegal bus_method not in %s" % transports.BUS_METHODS)
         if bus_method == 'bitbang' and mosi == sclk:
             raise ValueError("Illegal MOSI / SCLK can not be the same")
         if global_brightness < 0 or global_brightness > 31:
@@ -203,20 +260,58 @@ class APA102:
         of the driver could omit the "clockStartFrame" method if enough zeroes have
         been sent as part of "clockEndFrame".
         """
-        # Send reset frame necessary for SK9822 type LEDs
-        self.send_to_spi(bytes([0] * 4))
-        for _ in range((self.num_led + 15) // 16):
-            self.send_to_spi([0x00])
+        # Send reset frame necessary for SK9822 type LEDs, followed by the end frame
+        self.send_to_spi(bytes(4 + self.end_frame_length(self.num_led)))
+
+    @staticmethod
+    def end_frame_length(num_led):
+        """Number of end frame bytes needed to clock the data through num_led LEDs.
+
+        Half a bit per LED, rounded up to whole bytes: One byte of zeroes for every 16 LEDs.
+        """
+        return (num_led + 15) // 16
 
     def set_global_brightness(self, brigtness):
         """ Set the overall brightness of the strip."""
         self.global_brightness = brigtness
+        self.build_tables()
+
+    def set_order(self, order):
+        """ Set the order in which the strip expects the colours."""
+        order = order.lower()
+        if order not in RGB_MAP:
+            raise ValueError("Illegal order not in %s" % list(RGB_MAP.keys()))
+        self.rgb = RGB_MAP[order]
+        self.build_tables()
+
+    def set_correction(self, gamma=None, white_balance=None, color_temperature=None):
+        """Sets the color correction. Without arguments, the correction is switched off.
+
+        The correction is compiled into one 256 byte table per channel (see module correction),
+        and applied while the frame is encoded in show, with one bytes.translate per channel.
+        The pixel buffer keeps the colors as they were set, i.e. get_pixel returns the uncorrected
+        colors. The brightness is not affected.
+        """
+        self.correction_tables = correction.correction_tables(gamma, white_balance, color_temperature)
+        self.dither_tables = correction.dither_tables(gamma, white_balance, color_temperature)
+        if self.correction_tables is not None and self.corrected_frame is None:
+            self.corrected_frame = bytearray(len(self.frame))
+        self.mark_dirty()
+
+    def build_tables(self):
+        """Internal method to precompute the lookup tables that depend on brightness and color order.
+
+        The brightness table maps a brightness percentage of 0 to 100 to the first byte of an LED frame.
+        The wheel table is only computed when needed, see wheel_frames.
+        """
+        self.brightness_table = {percent: self.compute_led_start(percent) for percent in range(101)}
+        self.wheel_frame_table = None
+        self.hdr_table = None
 
     def clear_strip(self):
         """ Turns off the strip and shows the result right away."""
 
-        for led in range(self.num_led):
-            self.set_pixel(led, 0, 0, 0)
+        self.fill(0)
         self.show()
 
     def set_pixel(self, led_num, red, green, blue, bright_percent=100):
@@ -231,6 +326,24 @@ class APA102:
         if led_num >= self.num_led:
             return  # again, invisible
 
+        ledstart = self.led_start(bright_percent)
+
+        start_index = 4 * self.physical(led_num)
+        self.leds[start_index] = ledstart
+        self.leds[start_index + self.rgb[0]] = red
+        self.leds[start_index + self.rgb[1]] = green
+        self.leds[start_index + self.rgb[2]] = blue
+        self.mark_dirty(led_num, led_num + 1)
+
+    def led_start(self, bright_percent=100):
+        """Returns the first byte of an LED frame for the given brightness."""
+        ledstart = self.brightness_table.get(bright_percent)
+        if ledstart is None:
+            ledstart = self.compute_led_start(bright_percent)
+        return ledstart
+
+    def compute_led_start(self, bright_percent):
+        """Computes the first byte of an LED frame for the given brightness; Use led_start instead."""
         # Calculate pixel brightness as a percentage of the
         # defined global_brightness. Round up to nearest integer
         # as we expect some brightness unless set to 0
@@ -238,13 +351,20 @@ class APA102:
         brightness = int(brightness)
 
         # LED start frame is three "1" bits, followed by 5 brightness bits
-        ledstart = (brightness & 0b00011111) | self.LED_START
+        return (brightness & 0b00011111) | self.LED_START
 
-        start_index = 4 * led_num
-        self.leds[start_index] = ledstart
-        self.leds[start_index + self.rgb[0]] = red
-        self.leds[start_index + self.rgb[1]] = green
-        self.leds[start_index + self.rgb[2]] = blue
+    def led_frame(self, rgb_color, bright_percent=100):
+        """Returns the 4 bytes that represent one LED in the pixel buffer.
+
+        Colors are passed combined (3 bytes concatenated), the bytes
+        are returned in the order that the strip expects.
+        """
+        led = bytearray(4)
+        led[0] = self.led_start(bright_percent)
+        led[self.rgb[0]] = (rgb_color & 0xFF0000) >> 16
+        led[self.rgb[1]] = (rgb_color & 0x00FF00) >> 8
+        led[self.rgb[2]] = rgb_color & 0x0000FF
+        return bytes(led)
 
     def set_pixel_rgb(self, led_num, rgb_color, bright_percent=100):
         """Sets the color of one pixel in the LED stripe.
@@ -258,6 +378,106 @@ class APA102:
                        (rgb_color & 0x00FF00) >> 8, rgb_color & 0x0000FF,
                        bright_percent)
 
+    def fill(self, rgb_color, bright_percent=100):
+        """Sets all pixels of the LED stripe to the same color.
+
+        The changed pixels are not shown yet on the Stripe, they are only
+        written to the pixel buffer.
+        Colors are passed combined (3 bytes concatenated)
+        """
+        self.set_range(0, self.num_led, rgb_color, bright_percent)
+
+    def set_range(self, start, stop, rgb_color, bright_percent=100):
+        """Sets the pixels from start up to, but not including, stop to the same color.
+
+        Pixels outside of the strip are ignored, just like with set_pixel.
+        Colors are passed combined (3 bytes concatenated)
+        """
+        start = max(start, 0)
+        stop = min(stop, self.num_led)
+        if start >= stop:
+            return  # Nothing visible to paint
+        self.write_leds(start, self.led_frame(rgb_color, bright_percent) * (stop - start))
+
+    def set_pixels(self, pixels, start=0, bright_percent=100):
+        """Sets consecutive pixels, beginning at led number start, from a buffer of colors.
+
+        pixels is anything that supports the buffer protocol and contains one byte
+        each for red, green and blue per LED: bytes, bytearray, array('B'), a memoryview,
+        or an (N, 3) uint8 NumPy array. The colors are copied into the pixel buffer one
+        channel at a time with slice assignments, applying the color order of the strip.
+        Pixels outside of the strip are ignored.
+        """
+        colors = color_buffer(pixels)
+        skip = max(-start, 0)  # Pixels before the start of the strip
+        start += skip
+        count = min(len(colors) // 3 - skip, self.num_led - start)
+        if count <= 0:
+            return  # Nothing visible to paint
+        leds = bytearray(4 * count)
+        leds[0::4] = bytes([self.led_start(bright_percent)]) * count
+        for channel in range(3):
+            leds[self.rgb[channel]::4] = colors[3 * skip + channel:3 * (skip + count):3]
+        self.write_leds(start, leds)
+
+    def write_leds(self, start, leds):
+        """Internal method to copy LED frames into the pixel buffer, beginning at led number start.
+
+        The LEDs must fit on the strip. Only marks the LEDs as changed if their content
+        actually changes, i.e. painting the same colors again is not a change.
+        """
+        leds = memoryview(leds)
+        changed = False
+        for physical, logical, count in self.segments(start, start + len(leds) // 4):
+            source = leds[4 * (logical - start):4 * (logical - start + count)]
+            target = self.leds[4 * physical:4 * (physical + count)]
+            if target != source:
+                target[:] = source
+                changed = True
+        if changed:
+            self.mark_dirty(start, start + len(leds) // 4)
+
+    def physical(self, led_num):
+        """Internal method: Returns the position of an LED in the pixel buffer, see rotate."""
+        led_num += self.offset
+        if led_num >= self.num_led:
+            led_num -= self.num_led
+        return led_num
+
+    def segments(self, start, stop):
+        """Internal method: Splits the LEDs from start up to stop into the contiguous pieces of the pixel buffer.
+
+        Returns a list of (position in the pixel buffer, led number, number of LEDs). Without
+        rotation, this is just one piece. Otherwise, there can be a second piece that wraps around
+        to the start of the pixel buffer.
+        """
+        physical = self.physical(start)
+        count = min(stop - start, self.num_led - physical)
+        if count == stop - start:
+            return [(physical, start, count)]
+        return [(physical, start, count), (0, start + count, stop - start - count)]
+
+    def mark_dirty(self, start=0, stop=None):
+        """Marks the pixels from start up to, but not including, stop as changed.
+
+        All methods that change the pixel buffer do this on their own. Only code that
+        writes directly into the leds view must call it, so that show() with skip_unchanged
+        or partial_update knows what to send. Without arguments, the entire strip is marked.
+        """
+        if stop is None:
+            stop = self.num_led
+        self.dirty_low = min(self.dirty_low, start)
+        self.dirty_high = max(self.dirty_high, stop)
+
+    def is_dirty(self):
+        """Returns true if the pixel buffer changed since the last show."""
+        return self.dirty_low < self.dirty_high
+
+    def mark_clean(self):
+        """Marks the pixel buffer as unchanged, as if it had just been shown."""
+        self.dirty_low = self.num_led
+        self.dirty_high = 0
+
     def get_pixel(self, led_num):
         """Gets the color and brightness of one pixel in the LED stripe.
 
@@ -270,7 +490,7 @@ class APA102:
             return  # again, invisible
 
         output = {"red": 0, "green": 0, "blue": 0, "brightness": 0}
-        start_index = 4 * led_num
+        start_index = 4 * self.physical(led_num)
 
         # Filter out the three start bits
         output["bright_percent"] = self.leds[start_index] & 0b00011111
@@ -306,31 +526,222 @@ class APA102:
         Treating the internal LED array as a circular buffer, rotate it by
         the specified number of positions. The number could be negative,
         which means rotating in the opposite direction.
+
+        The pixel buffer itself is not touched: Only the offset of LED 0 within
+        the buffer changes, so this takes the same (short) time for any number of
+        LEDs. All methods take the offset into account. Only code that accesses
+        the leds view directly must do so: LED i is at position (i + offset) % num_led.
         """
-        cutoff = 4 * (positions % self.num_led)
-        self.leds = self.leds[cutoff:] + self.leds[:cutoff]
+        self.offset = (self.offset + positions) % self.num_led
+        self.mark_dirty()
 
-    def show(self):
+    def show(self, force=False):
         """Sends the content of the pixel buffer to the strip.
 
-        Todo: More than 1024 LEDs requires more than one xfer operation.
+        The start frame, the pixels, the reset frame and the end frame live in
+        one preallocated buffer (the pixel buffer is a view into it), and are sent
+        to the strip in a single SPI write. This is the same data that clock_start_frame,
+        send_to_spi and clock_end_frame would send, but without the overhead of one
+        bus transaction per part, and without converting the pixels first.
+
+        Frames longer than max_transfer (i.e. more than about 1000 LEDs) are sent
+        in several writes, but the bus is only acquired once for the entire frame.
+        Because an LED takes over its new color the moment its 32 bits have arrived,
+        and keeps the color until the next frame, the short gaps between two writes
+        do not show on the strip.
+
+        With skip_unchanged, nothing is sent if the pixel buffer did not change since
+        the last show. With partial_update, only the LEDs up to the last changed one
+        are sent, followed by an end frame that is long enough for these LEDs. The
+        remaining LEDs just pass the zeroes of the end frame along, and keep their color.
+        force sends the entire buffer regardless.
+
+        With threaded, the frame is copied into a free transmit buffer and handed
+        over to the transmit thread. show returns right away, and the next frame can
+        be rendered while this one is still being sent. Only if all queue_depth transmit
+        buffers are in use, show waits for the thread to catch up.
+        """
+        stats = self.stats
+        if stats is not None:
+            started = time.perf_counter()
+        if self.dither:
+            self.measure_frame_rate()
+        buffers = self.encode(force)
+        if stats is not None:
+            stats.record('encode', time.perf_counter() - started)
+        self.send(buffers)
+
+    def encoded_frame(self):
+        """Returns the entire frame that show would send now, as bytes. See show_frame.
+
+        The color correction is part of the frame, and dithering is frozen at its current state.
+        Nothing is sent: The pixel buffer stays marked as changed, and the dither remainders
+        are not carried over, so the next show is the same as without this call.
+        """
+        return b''.join(self.frame_buffers(self.num_led, self.dithering(), keep_remainders=False))
+
+    def show_frame(self, frame):
+        """Sends a frame from encoded_frame to the strip, e.g. one that was recorded earlier.
+
+        The pixel buffer is not involved, i.e. no colors are converted. The frame is sent
+        the same way as by show, e.g. by the transmit thread if threaded is used.
+        """
+        self.send([frame])
+
+    def send(self, buffers):
+        """Internal method: Sends a frame (None if nothing changed), and ends it in the statistics.
+
+        With threaded, the frame and its timings go to the transmit thread, which ends the frame
+        once it is sent.
         """
-        self.clock_start_frame()
-        # xfer2 kills the list, unfortunately. So it must be copied first
-        # SPI takes up to 4096 Integers. So we are fine for up to 1024 LEDs.
-        self.send_to_spi(self.leds)
-        self.clock_end_frame()
+        stats = self.stats
+        if buffers is not None and self.transmit_thread is not None:
+            self.queue_frame(buffers, None if stats is None else stats.take_frame())
+            return
+        if buffers is not None:
+            self.transmit(buffers)
+        if stats is not None:
+            stats.frame_done()
+
+    def encode(self, force=False):
+        """Internal method: Returns the frame for show as a list of buffers, or None if there is nothing to send"""
+        count = self.num_led  # LEDs to send
+        dithering = self.dithering()
+        if not force and self.skip_unchanged and not dithering:  # A dithered frame changes on every show
+            if not self.is_dirty():
+                return None
+            if self.partial_update:
+                count = self.dirty_high
+        self.mark_clean()
+        return self.frame_buffers(count, dithering)
+
+    def frame_buffers(self, count, dithering, keep_remainders=True):
+        """Internal method: Returns the frame with the first count LEDs as a list of buffers, see encode"""
+        segments = self.segments(0, count)
+        frame = self.frame
+        if dithering:
+            frame = self.correct_dithered(segments, keep_remainders)
+        elif self.correction_tables is not None:
+            frame = self.correct(segments)
+        if count == self.num_led and self.offset == 0:
+            return [frame]  # The usual case: Send the buffer as it is
+        # Start frame, the pixels in the order of the strip, then reset frame and end frame out of the zeroes at the end
+        frame = memoryview(frame)
+        tail = 4 + 4 * self.num_led
+        return ([frame[:4]] +
+                [frame[4 + 4 * physical:4 + 4 * (physical + length)] for physical, _, length in segments] +
+                [frame[tail:tail + 4 + self.end_frame_length(count)]])
+
+    def correct(self, segments):
+        """Internal method: Copies the segments of the pixel buffer into the corrected frame, and corrects them.
+
+        Returns the corrected frame. The brightness bytes are copied as they are, the colors are
+        translated with the correction table of their channel.
+        """
+        leds = memoryview(self.corrected_frame)[4:4 + 4 * self.num_led]
+        for physical, _, length in segments:
+            low, high = 4 * physical, 4 * (physical + length)
+            leds[low:high:4] = self.leds[low:high:4]
+            for channel in range(3):
+                position = self.rgb[channel]
+                leds[low + position:high:4] = self.leds[low + position:high:4].tobytes().translate(
+                    self.correction_tables[channel])
+        return self.corrected_frame
+
+    def measure_frame_rate(self):
+        """Internal method: Updates the average time between two shows"""
+        now = time.monotonic()
+        if self.last_show is not None:
+            interval = now - self.last_show
+            if self.frame_interval is None:
+                self.frame_interval = interval
+            else:
+                self.frame_interval += (interval - self.frame_interval) / 16
+        self.last_show = now
+
+    def dithering(self):
+        """Returns true if show currently dithers the colors.
+
+        The color correction maps the 8 bit colors to values in between two 8 bit steps,
+        e.g. a gamma of 2.2 turns 20 into 0.95 and 30 into 2.3. Usually, these values are
+        rounded, which makes dark colors and slow fades band. With dither, the fractions are
+        kept per LED and channel, and carried over to the next frames: 2.3 is sent as 2 in
+        seven out of ten frames, and as 3 in the other three. The eye averages this out, but
+        only if the frames come fast enough. Otherwise, it shows as flicker. Therefore, dithering
+        is only done while show is called at least dither_min_fps times per second (and if
+        a correction is set).
+        """
+        if not self.dither or self.dither_tables is None:
+            return False
+        return not self.dither_min_fps or (self.frame_interval is not None and
+                                           self.frame_interval * self.dither_min_fps <= 1.0)
+
+    def correct_dithered(self, segments, keep_remainders=True):
+        """Internal method: The same as correct, but with temporal dithering, see dithering.
+
+        Per channel, the colors are looked up in the 16 bit correction table (8 bits of fraction),
+        and the remainders of the last frames are added. The upper bytes are sent, the lower bytes
+        are the new remainders, unless keep_remainders is false. This runs with map over entire
+        slices of the pixel buffer.
+        """
+        leds = memoryview(self.corrected_frame)[4:4 + 4 * self.num_led]
+        error = self.dither_error
+        for physical, _, length in segments:
+            low, high = 4 * physical, 4 * (physical + length)
+            leds[low:high:4] = self.leds[low:high:4]
+            for channel in range(3):
+                position = self.rgb[channel]
+                table = self.dither_tables[channel]
+                totals = list(map(operator.add, map(table.__getitem__, self.leds[low + position:high:4]),
+                                  error[low + position:high:4]))
+                leds[low + position:high:4] = bytes(map(operator.rshift, totals, repeat(8)))
+                if keep_remainders:
+                    error[low + position:high:4] = bytes(map(operator.and_, totals, repeat(0xFF)))
+        return self.corrected_frame
+
+    def queue_frame(self, buffers, timings=None):
+        """Internal method to hand a frame, and its timings for the statistics, over to the transmit thread"""
+        if self.transmit_error is not None:
+            error, self.transmit_error = self.transmit_error, None
+            raise error
+        back_buffer = self.free_buffers.get()  # Waits if the transmit thread falls behind
+        length = 0
+        for data in buffers:
+            back_buffer[length:length + len(data)] = data
+            length += len(data)
+        self.pending_frames.put((back_buffer, length, timings))
+
+    def transmit_worker(self):
+        """Internal method: Main loop of the transmit thread"""
+        while True:
+            back_buffer, length, timings = self.pending_frames.get()
+            try:
+                if back_buffer is None:
+                    return  # Asked to stop
+                self.transmit([memoryview(back_buffer)[:length]], timings)
+            except Exception as error:  # Handed to the caller on the next show
+                self.transmit_error = error
+            finally:
+                if back_buffer is not None:
+                    self.free_buffers.put(back_buffer)
+                if timings is not None:
+                    self.stats.frame_done(timings)
+                self.pending_frames.task_done()
+
+    def flush(self):
+        """Waits until all frames are sent to the strip. Does nothing if threaded is not used."""
+        if self.transmit_thread is not None:
+            self.pending_frames.join()
 
     def cleanup(self):
         """Release the SPI device; Call this method at the end"""
-        # Try to unlock, in case it is still locked
-        try:
-            self.spi.unlock()  # Unlock first
-        except ValueError:
-            # Do nothing, the bus was not locked
-            pass
         self.clear_strip()
-        self.spi.deinit()  # Close SPI port
+        if self.transmit_thread is not None:
+            # Let the transmit thread send the remaining frames, then stop it
+            self.pending_frames.put((None, 0, None))
+            self.transmit_thread.join()
+            self.transmit_thread = None
+        self.transport.close()  # Close SPI port
 
     @staticmethod
     def combine_color(red, green, blue):
@@ -341,31 +752,115 @@ class APA102:
     def wheel(self, wheel_pos):
         """Get a color from a color wheel; Green -> Red -> Blue -> Green"""
 
-        if wheel_pos > 255:
-            wheel_pos = 255  # Safeguard
-        if wheel_pos < 85:  # Green -> Red
-            return self.combine_color(wheel_pos * 3, 255 - wheel_pos * 3, 0)
-        if wheel_pos < 170:  # Red -> Blue
-            wheel_pos -= 85
-            return self.combine_color(255 - wheel_pos * 3, 0, wheel_pos * 3)
-        # Blue -> Green
-        wheel_pos -= 170
-        return self.combine_color(0, wheel_pos * 3, 255 - wheel_pos * 3)
+        if isinstance(wheel_pos, int) and wheel_pos >= 0:
+            return WHEEL_COLORS[min(wheel_pos, 255)]  # Safeguard
+        return wheel_color(wheel_pos)
+
+    def wheel_frames(self):
+        """Returns the 256 colors of the wheel as LED frames, ready to be copied into the pixel buffer.
+
+        The frames are in the color order of the strip, with a brightness of 100%. The table is
+        computed on first use, and again after the global brightness or the color order changed.
+        """
+        if self.wheel_frame_table is None:
+            self.wheel_frame_table = [self.led_frame(color) for color in WHEEL_COLORS]
+        return self.wheel_frame_table
+
+    def set_pixels_wheel(self, wheel_positions, start=0):
+        """Sets consecutive pixels, beginning at led number start, to colors from the color wheel.
+
+        wheel_positions is an iterable of integers from 0 to 255. The LED frames are looked up
+        in the precomputed wheel table, and copied into the pixel buffer in one go.
+        """
+        self.set_led_frames(b''.join(map(self.wheel_frames().__getitem__, wheel_positions)), start)
+
+    def hdr_brightness(self):
+        """Returns the table for set_pixels_hdr: The 5 bit brightness for every 16 bit intensity.
+
+        Entry m is the lowest brightness at which an 8 bit color can show the intensity m, i.e.
+        ceil(m * global_brightness / 65535). The table has 65536 entries, and is computed on
+        first use, and again after the global brightness changed.
+        """
+        if self.hdr_table is None:
+            brightness = self.global_brightness
+            self.hdr_table = bytes((intensity * brightness + 65534) // 65535 for intensity in range(65536))
+        return self.hdr_table
+
+    def set_pixels_hdr(self, pixels, start=0):
+        """Sets consecutive pixels, beginning at led number start, from a buffer of 16 bit intensities.
+
+        pixels is anything that supports the buffer protocol and contains three unsigned 16 bit
+        integers (in the byte order of the machine) per LED for red, green and blue: array('H'),
+        or an (N, 3) uint16 NumPy array. 65535 is the full color at the global brightness.
+
+        Per pixel, the 5 bit brightness of the LED frame is set to the lowest value that can show
+        the brightest channel, and the 8 bit colors are scaled up accordingly. Dark colors then use
+        a low brightness with almost the full 8 bits of color, instead of a few steps of 8 bit color
+        at full brightness, so that slow fades to black don't band. The brightness comes from a
+        precomputed table, and all pixels are converted in bulk with map, one channel at a time.
+        """
+        values = memoryview(pixels)
+        if not values.c_contiguous:
+            values = memoryview(values.tobytes())
+        values = values.cast('B').cast('H')
+        skip = max(-start, 0)  # Pixels before the start of the strip
+        start += skip
+        count = min(len(values) // 3 - skip, self.num_led - start)
+        if count <= 0:
+            return  # Nothing visible to paint
+        channels = [values[3 * skip + channel:3 * (skip + count):3] for channel in range(3)]
+        brightness = bytes(map(self.hdr_brightness().__getitem__, map(max, *channels)))
+        # Color = round(intensity * global_brightness / (257 * brightness)), as an integer division
+        divisors = [257 * 2 * level or 1 for level in range(32)]
+        divisors = list(map(divisors.__getitem__, brightness))
+        halves = list(map(operator.rshift, divisors, repeat(1)))
+        leds = bytearray(4 * count)
+        leds[0::4] = bytes(map(self.LED_START.__or__, brightness))
+        for channel in range(3):
+            scaled = map(operator.mul, channels[channel], repeat(2 * self.global_brightness))
+            leds[self.rgb[channel]::4] = bytes(map(operator.floordiv, map(operator.add, scaled, halves), divisors))
+        self.write_leds(start, leds)
+
+    def set_led_frames(self, leds, start=0):
+        """Copies ready made LED frames (4 bytes per LED, as in the pixel buffer) into the pixel buffer."""
+        skip = max(-start, 0)  # LEDs before the start of the strip
+        start += skip
+        count = min(len(leds) // 4 - skip, self.num_led - start)
+        if count <= 0:
+            return  # Nothing visible to paint
+        self.write_leds(start, memoryview(leds)[4 * skip:4 * (skip + count)])
 
     def send_to_spi(self, data):
-        """Internal method to output data to the chosen SPI device"""
-        if self.use_ce:
-            with self.spibus as bus_device:
-                bus_device.write(data)
-        elif self.use_bitbang:
-            while not self.spi.try_lock():
-                # Busy wait to acquire the lock
-                pass
-            self.spi.write(data)
-            self.spi.unlock()
-        else:
-            self.spi.write(data)
+        """Internal method to output data to the chosen SPI device
+
+        Data longer than max_transfer is split into several writes of at most max_transfer bytes,
+        all of them within one bus transaction.
+        """
+        self.transmit([data])
+
+    def transmit(self, buffers, timings=None):
+        """Internal method to output several buffers, one after the other, in one bus transaction
+
+        The lock and transmit times go to the frame in progress of the statistics, or to timings.
+        """
+        stats = self.stats
+        if stats is None:
+            self.transport.write(buffers)
+            return
+        lock_wait_time = self.transport.lock_wait_time
+        started = time.perf_counter()
+        self.transport.write(buffers)
+        elapsed = time.perf_counter() - started
+        lock_wait_time = self.transport.lock_wait_time - lock_wait_time
+        stats.record('lock', lock_wait_time, timings)
+        stats.record('transmit', elapsed - lock_wait_time, timings)
 
     def dump_array(self):
         """For debug purposes: Dump the LED array onto the console."""
-        logging.debug(self.leds)
+        logging.debug(self.leds.tolist())
+
+
+# The colors of the wheel never change, so they are computed only once
+WHEEL_COLORS = [wheel_color(wheel_pos) for wheel_pos in range(256)]
+# The same, as 3 bytes red, green and blue (the format of set_pixels)
+WHEEL_PIXELS = [color.to_bytes(3, 'big') for color in WHEEL_COLORS]
@@ -0,0 +1,60 @@
+"""The module contains an asyncio front end for the APA102 driver"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from apa102_pi.driver import apa102
+
+
+class AsyncAPA102:
+    """Driver for APA102 LEDs, for use from an asyncio event loop.
+
+    Setting pixels only changes the pixel buffer in memory, and is quick. These methods
+    (set_pixel, fill, set_pixels, rotate, ...) are the ones of the wrapped APA102, and
+    are called as usual. Sending the buffer to the strip takes time, and possibly waits
+    for the bus. The methods that do this are coroutines, and run the transfer in an
+    executor thread, so that the event loop keeps serving other tasks in the meantime:
+     - await show()
+     - await show_frame()
+     - await clear_strip()
+     - await cleanup()
+
+    Don't change the pixel buffer while a show is still in progress, i.e. await it first.
+    """
+
+    def __init__(self, executor=None, strip=None, **kwargs):
+        """Initializes the library
+
+        :param executor: Executor to run the transfers in. Default is a thread pool with one thread, which
+                         keeps the frames in order.
+        :param strip: An existing strip to wrap, e.g. a multistrip.MultiStrip. Default is a new APA102.
+        :param kwargs: All other arguments are passed to APA102
+        """
+        self.strip = strip if strip is not None else apa102.APA102(**kwargs)
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='apa102')
+
+    def __getattr__(self, name):
+        # Everything else is the synchronous APA102 interface
+        return getattr(self.strip, name)
+
+    async def run(self, method, *args):
+        """Internal method to run one of the blocking strip methods in the executor"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def show(self, force=False):
+        """Sends the content of the pixel buffer to the strip, see APA102.show"""
+        await self.run(self.strip.show, force)
+
+    async def show_frame(self, frame):
+        """Sends a recorded frame to the strip, see APA102.show_frame"""
+        await self.run(self.strip.show_frame, frame)
+
+    async def clear_strip(self):
+        """Turns off the strip and shows the result right away."""
+        await self.run(self.strip.clear_strip)
+
+    async def cleanup(self):
+        """Release the SPI device; Call this method at the end"""
+        await self.run(self.strip.cleanup)
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
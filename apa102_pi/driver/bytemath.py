@@ -0,0 +1,80 @@
+"""The module contains arithmetic on entire byte strings at once, without a loop per byte.
+
+Python has no vector instructions, but it has arbitrarily large integers, and their
+arithmetic runs in C. A byte string of n bytes is spread into an integer with n lanes of
+16 bits (see lanes): Each byte sits in the lower half of its lane, and the upper half is
+free for the carries. A multiplication of this integer with a small number, or the sum
+of two of them, then works on all lanes at once ("SIMD within a register"), as long as no
+lane overflows its 16 bits.
+"""
+import sys
+from functools import lru_cache
+
+
+def lanes(data):
+    """Returns the bytes of data as an integer with one 16 bit lane per byte."""
+    spread = bytearray(2 * len(data))
+    spread[1::2] = data
+    return int.from_bytes(spread, 'big')
+
+
+def from_lanes(value, count):
+    """Returns the lower bytes of count 16 bit lanes as bytes. The opposite of lanes."""
+    return value.to_bytes(2 * count, 'big')[1::2]
+
+
+@lru_cache(maxsize=16)
+def ones(count):
+    """Returns an integer with the value 1 in each of count lanes."""
+    return int.from_bytes(b'\x00\x01' * count, 'big')
+
+
+def mix(first, second, weight, count):
+    """Returns the weighted average of two byte strings, given as lanes, as bytes.
+
+    weight goes from 0 (only first) to 256 (only second). Every byte is computed as
+    (first * (256 - weight) + second * weight + 128) / 256, which never exceeds 16 bits.
+    """
+    return from_lanes((first * (256 - weight) + second * weight + 128 * ones(count)) >> 8, count)
+
+
+def scale(value, weight, count):
+    """Returns the bytes of value (given as lanes) times weight / 256, rounded, as bytes."""
+    return from_lanes((value * weight + 128 * ones(count)) >> 8, count)
+
+
+def add(first, second, count):
+    """Returns the sums of two byte strings, given as lanes, as bytes. Sums above 255 are cut to 255."""
+    total = first + second
+    overflow = (total >> 8) & ones(count)  # 1 in every lane above 255
+    return from_lanes(total | overflow * 255, count)
+
+
+def maximum(first, second, count):
+    """Returns the larger byte of two byte strings, given as lanes, as bytes."""
+    one = ones(count)
+    # 256 + first - second in every lane: Bit 8 is set where first is not smaller
+    larger = ((first + (one << 8) - second) >> 8) & one
+    mask = larger * 255
+    return from_lanes(first & mask | second & (one * 255 ^ mask), count)
+
+
+@lru_cache(maxsize=1)
+def products():
+    """Returns the table for multiply: Entry 256 * a + b is a * b / 255, rounded. It is computed on first use."""
+    return bytes((first * second + 127) // 255 for first in range(256) for second in range(256))
+
+
+def multiply(first, second):
+    """Returns the products of two byte strings of the same length, divided by 255, as bytes.
+
+    A lane of one byte has no room for a product, so this works with a table of all 65536
+    products instead: The bytes of first and second are interleaved into 16 bit table
+    indexes, and looked up with map.
+    """
+    pairs = bytearray(2 * len(first))
+    # The upper byte of a 16 bit number comes first or last, depending on the machine
+    upper = 1 if sys.byteorder == 'little' else 0
+    pairs[upper::2] = first
+    pairs[1 - upper::2] = second
+    return bytes(map(products().__getitem__, memoryview(pairs).cast('H')))
@@ -1,7 +1,11 @@
 """The module contains templates for colour cycles"""
+import asyncio
 import time
 
 from apa102_pi.driver import apa102
+from apa102_pi.driver import asyncapa102
+from apa102_pi.driver import framecache
+from apa102_pi.driver import framescheduler
 
 
 class ColorCycleTemplate:
@@ -10,11 +14,20 @@ class ColorCycleTemplate:
 
     A specific color cycle must subclass this template, and implement at least the
     'update' method.
+
+    A color cycle whose frames depend on nothing but current_step (i.e. not on current_cycle,
+    the time or the previous frames) can declare this with periodic = True. With cache_frames,
+    the frames of such a cycle are then rendered only once. They are recorded as they are
+    sent to the strip, and replayed from a framecache.FrameCache in the following cycles.
     """
 
+    periodic = False  # True if the frames only depend on current_step, see cache_frames
+
     def __init__(self, num_led, pause_value=0, num_steps_per_cycle=100,
                  num_cycles=-1, order='rbg', bus_method='spi', spi_bus=0, mosi=None, sclk=None, ce=None,
-                 bus_speed_hz=8000000, global_brightness=4):
+                 bus_speed_hz=8000000, global_brightness=4, skip_unchanged=False, fps=None, late_policy='skip',
+                 align_frames=False, threaded=False, transport=None, stats=None, strip=None,
+                 cache_frames=False, cache_bytes=16 * 1024 * 1024, cache_spill=None):
         self.num_led = num_led  # The number of LEDs in the strip
         self.pause_value = pause_value  # How long to pause between two runs
         self.num_steps_per_cycle = num_steps_per_cycle  # Steps in one cycle.
@@ -27,6 +40,17 @@ class ColorCycleTemplate:
         self.ce = ce  # Chip select
         self.bus_speed_hz = bus_speed_hz  # Bus speed
         self.global_brightness = global_brightness  # Overall brightness of the strip
+        self.skip_unchanged = skip_unchanged  # Do not send frames to the strip that did not change
+        self.fps = fps  # If set, run at this frame rate instead of pausing pause_value between two runs
+        self.late_policy = late_policy  # With fps: skip or catchup late frames
+        self.align_frames = align_frames  # With fps: align the frames to the wall clock to sync controllers
+        self.threaded = threaded  # Send frames from a background thread, while the next one is rendered
+        self.transport = transport  # If set, send the frames with this transport instead of the bus_method
+        self.stats = stats  # If set, a framestats.FrameStats object that records where the time goes
+        self.strip = strip  # If set, paint on this strip (e.g. a multistrip.MultiStrip) instead of creating one
+        self.cache_frames = cache_frames  # Replay the frames of a periodic color cycle instead of rendering them
+        self.cache_bytes = cache_bytes  # With cache_frames: Memory for the frames
+        self.cache_spill = cache_spill  # With cache_frames: File to keep the frames that don't fit into memory
 
     def init(self, strip, num_led):
         """This method is called to initialize a color program.
@@ -64,29 +88,110 @@ class ColorCycleTemplate:
         strip.clear_strip()
         strip.cleanup()
 
+    def strip_arguments(self):
+        """Returns the arguments to initialize the strip with."""
+        return {'num_led': self.num_led, 'bus_method': self.bus_method, 'spi_bus': self.spi_bus,
+                'mosi': self.mosi, 'sclk': self.sclk, 'order': self.order, 'ce': self.ce,
+                'bus_speed_hz': self.bus_speed_hz, 'global_brightness': self.global_brightness,
+                'skip_unchanged': self.skip_unchanged, 'threaded': self.threaded, 'transport': self.transport,
+                'stats': self.stats}
+
+    def create_strip(self):
+        """Returns the strip to paint on: The one passed to the constructor, or a new APA102."""
+        if self.strip is not None:
+            return self.strip
+        return apa102.APA102(**self.strip_arguments())
+
+    def create_cache(self, strip):
+        """Returns the frame cache for a strip, or None if frames are not cached.
+
+        Only strips that can record and replay their frames (see APA102.encoded_frame) are
+        cached, e.g. not a multistrip.MultiStrip. A dithering strip is not cached either:
+        Its frames change on every show, even if the colors don't.
+        """
+        if not self.cache_frames or not self.periodic:
+            return None
+        if not hasattr(strip, 'encoded_frame') or not hasattr(strip, 'show_frame') or getattr(strip, 'dither', False):
+            return None
+        return framecache.FrameCache(self.cache_bytes, self.cache_spill)
+
+    def cached_frame(self, strip, cache, current_step, current_cycle):
+        """Returns the frame of a step from the cache. If it is not there yet, it is rendered and recorded."""
+        frame = cache.get(current_step)
+        if frame is None:
+            self.update(strip, self.num_led, self.num_steps_per_cycle, current_step, current_cycle)
+            frame = strip.encoded_frame()
+            cache.put(current_step, frame)
+        return frame
+
+    def create_scheduler(self):
+        """Returns the frame scheduler and the first step, or no scheduler if fps is not used."""
+        if not self.fps:
+            return None, 0
+        scheduler = framescheduler.FrameScheduler(self.fps, self.late_policy, self.align_frames)
+        first_frame = scheduler.start()
+        # When aligned to the wall clock, all controllers are at the same step at the same time
+        return scheduler, first_frame % self.num_steps_per_cycle
+
+    def advance(self, current_step, current_cycle, steps):
+        """Moves on by a number of steps. Returns the new step and cycle, or None when finished."""
+        current_step += steps
+        if current_step >= self.num_steps_per_cycle:
+            current_cycle += current_step // self.num_steps_per_cycle
+            current_step %= self.num_steps_per_cycle
+            if self.num_cycles != -1 and current_cycle >= self.num_cycles:
+                return None
+        return current_step, current_cycle
+
     def start(self):
         """This method does the actual work."""
         strip = None
+        cache = None
         try:
-            strip = apa102.APA102(num_led=self.num_led, bus_method=self.bus_method, spi_bus=self.spi_bus,
-                                  mosi=self.mosi, sclk=self.sclk,
-                                  order=self.order, ce=self.ce, bus_speed_hz=self.bus_speed_hz,
-                                  global_brightness=self.global_brightness)  # Initialize the strip
+            strip = self.create_strip()  # Initialize the strip
+            cache = self.create_cache(strip)
             strip.clear_strip()
             self.init(strip, self.num_led)  # Call the subclasses init method
             strip.show()
-            current_cycle = 0
-            while True:  # Loop forever
-                for current_step in range(self.num_steps_per_cycle):
+            scheduler, current_step = self.create_scheduler()
+            position = current_step, 0
+            stats = self.stats
+            first = True
+            while True:  # Loop until all cycles are done, or forever
+                if stats is not None:
+                    started = time.perf_counter()
+                if first:
+                    first = False
+                    if scheduler is not None:
+                        scheduler.sleep_until(scheduler.frame_number)  # Wait for the first frame
+                else:
+                    if scheduler is None:
+                        time.sleep(self.pause_value)  # Pause until the next step
+                        steps = 1
+                    else:
+                        steps = scheduler.wait()  # Pause until the next frame is due
+                    position = self.advance(current_step, current_cycle, steps)
+                    if position is None:
+                        break
+                if stats is not None:
+                    stats.record('sleep', time.perf_counter() - started)
+                    started = time.perf_counter()
+                current_step, current_cycle = position
+                if cache is None:
+                    frame = None
                     need_repaint = self.update(strip, self.num_led,
                                                self.num_steps_per_cycle,
                                                current_step, current_cycle)
-                    if need_repaint:
-                        strip.show()  # repaint if required
-                    time.sleep(self.pause_value)  # Pause until the next step
-                current_cycle += 1
-                if self.num_cycles != -1 and current_cycle >= self.num_cycles:
-                    break
+                else:
+                    frame = self.cached_frame(strip, cache, current_step, current_cycle)
+                if stats is not None:
+                    stats.record('render', time.perf_counter() - started)
+                if frame is not None:
+                    strip.show_frame(frame)  # Replay the recorded frame
+                elif need_repaint:
+                    strip.show()  # repaint if required
+                elif stats is not None:
+                    stats.take_frame()  # Nothing shown: Drop the timings of this step
             # Finished, cleanup everything
             self.cleanup(strip)
 
@@ -94,3 +199,69 @@ class ColorCycleTemplate:
             print('Interrupted...')
             if strip is not None:
                 strip.cleanup()
+        finally:
+            if cache is not None:
+                cache.close()
+
+    async def start_async(self):
+        """This method does the same as start, but as an asyncio coroutine.
+
+        The pauses between the steps are spent in asyncio.sleep, and the strip is
+        an AsyncAPA102 that sends the frames from a worker thread. Other tasks on the
+        same event loop keep running while the light program plays. The init, update
+        and shutdown methods of the color cycle are called as usual, with the plain
+        APA102 strip. Cancel the task to halt the light program: shutdown and cleanup
+        still run.
+        """
+        strip = asyncapa102.AsyncAPA102(strip=self.strip, **self.strip_arguments())  # Initialize the strip
+        cache = self.create_cache(strip.strip)
+        try:
+            await strip.clear_strip()
+            self.init(strip.strip, self.num_led)  # Call the subclasses init method
+            await strip.show()
+            scheduler, current_step = self.create_scheduler()
+            position = current_step, 0
+            stats = self.stats
+            first = True
+            while True:  # Loop until all cycles are done, or forever
+                if stats is not None:
+                    started = time.perf_counter()
+                if first:
+                    first = False
+                    if scheduler is not None:
+                        await asyncio.sleep(scheduler.delay_until(scheduler.frame_number))  # Wait for the first frame
+                else:
+                    if scheduler is None:
+                        await asyncio.sleep(self.pause_value)  # Pause until the next step
+                        steps = 1
+                    else:
+                        steps, delay = scheduler.next_frame()
+                        await asyncio.sleep(delay)  # Pause until the next frame is due
+                    position = self.advance(current_step, current_cycle, steps)
+                    if position is None:
+                        break
+                if stats is not None:
+                    stats.record('sleep', time.perf_counter() - started)
+                    started = time.perf_counter()
+                current_step, current_cycle = position
+                if cache is None:
+                    frame = None
+                    need_repaint = self.update(strip.strip, self.num_led,
+                                               self.num_steps_per_cycle,
+                                               current_step, current_cycle)
+                else:
+                    frame = self.cached_frame(strip.strip, cache, current_step, current_cycle)
+                if stats is not None:
+                    stats.record('render', time.perf_counter() - started)
+                if frame is not None:
+                    await strip.show_frame(frame)  # Replay the recorded frame
+                elif need_repaint:
+                    await strip.show()  # repaint if required
+                elif stats is not None:
+                    stats.take_frame()  # Nothing shown: Drop the timings of this step
+        finally:
+            # Finished or cancelled, cleanup everything
+            self.shutdown(strip.strip, self.num_led)
+            await strip.cleanup()
+            if cache is not None:
+                cache.close()
@@ -0,0 +1,141 @@
+"""The module contains a compositor that plays several color cycles on top of each other"""
+from apa102_pi.driver import apa102
+from apa102_pi.driver import bytemath
+from apa102_pi.driver import colorcycletemplate
+from apa102_pi.driver import transport
+
+BLEND_MODES = ['alpha', 'add', 'max', 'multiply']
+# For the alpha blending: The part of the colors below that shines through
+INVERTED = bytes(255 - value for value in range(256))
+
+
+class Layer:
+    """One color cycle of a Compositor, with its own pixel buffer.
+
+    The color cycle paints on a strip of its own that sends nowhere (see
+    transport.NullTransport). The compositor takes the colors from there.
+    """
+
+    def __init__(self, effect, num_led, blend='alpha', opacity=1.0):
+        if blend not in BLEND_MODES:
+            raise ValueError("Illegal blend not in %s" % BLEND_MODES)
+        if not 0.0 <= opacity <= 1.0:
+            raise ValueError("Illegal opacity must be from 0.0 to 1.0")
+        if effect.num_led != num_led:
+            raise ValueError("Illegal effect with %d LEDs on a strip of %d" % (effect.num_led, num_led))
+        self.effect = effect
+        self.blend = blend
+        self.opacity = int(round(opacity * 256))  # As a weight for bytemath
+        # With full brightness, a pixel at 100% has the brightness 31. This becomes its alpha.
+        self.strip = apa102.APA102(num_led=num_led, global_brightness=31, transport=transport.NullTransport())
+        self.alpha_table = bytes(int(round((value & 0b00011111) * 255 / 31 * opacity)) for value in range(256))
+        self.frame = 0  # Number of the next frame of the color cycle
+
+    def update(self):
+        """Paints the next frame of the color cycle. Returns true if the colors changed."""
+        steps = self.effect.num_steps_per_cycle
+        self.effect.update(self.strip, self.strip.num_led, steps, self.frame % steps, self.frame // steps)
+        self.frame += 1
+        return self.strip.is_dirty()
+
+    def pixels(self):
+        """Returns the colors (3 bytes per LED, as for set_pixels) and the alpha (1 byte per LED)."""
+        strip = self.strip
+        # The LED frames in the order of the LEDs, see APA102.rotate
+        leds = b''.join(strip.leds[4 * physical:4 * (physical + count)]
+                        for physical, _, count in strip.segments(0, strip.num_led))
+        colors = bytearray(3 * strip.num_led)
+        for channel in range(3):
+            colors[channel::3] = leds[strip.rgb[channel]::4]
+        return colors, leds[0::4].translate(self.alpha_table)
+
+    def compose(self, below):
+        """Returns the colors of this layer on top of the colors below (both 3 bytes per LED)."""
+        colors, alpha = self.pixels()
+        count = len(colors)
+        self.strip.mark_clean()
+        if self.blend == 'alpha':
+            # Per pixel: colors * alpha + below * (255 - alpha), with a 64K table of products
+            alphas = bytearray(count)
+            for channel in range(3):
+                alphas[channel::3] = alpha
+            return bytemath.add(bytemath.lanes(bytemath.multiply(alphas, colors)),
+                                bytemath.lanes(bytemath.multiply(alphas.translate(INVERTED), below)), count)
+        below_lanes = bytemath.lanes(below)
+        if self.blend == 'add':
+            if self.opacity != 256:
+                colors = bytemath.scale(bytemath.lanes(colors), self.opacity, count)
+            return bytemath.add(below_lanes, bytemath.lanes(colors), count)
+        if self.blend == 'max':
+            blended = bytemath.maximum(below_lanes, bytemath.lanes(colors), count)
+        else:
+            blended = bytemath.multiply(below, colors)
+        if self.opacity == 256:
+            return blended
+        return bytemath.mix(below_lanes, bytemath.lanes(blended), self.opacity, count)
+
+
+class Compositor(colorcycletemplate.ColorCycleTemplate):
+    """A color cycle that shows several color cycles at the same time, as layers on top of each other.
+
+    Every layer paints into a pixel buffer of its own. The compositor blends the layers,
+    starting with black below the first one, with one of these modes:
+     - alpha: The layer covers what is below. The brightness of a pixel (bright_percent of
+       set_pixel) is its opacity, i.e. a pixel at 100% covers entirely, a pixel at 50% lets
+       half of the colors below shine through. Pixels that were never set are transparent.
+     - add: The colors are added, e.g. for light from several sources.
+     - max: The brighter color of each channel wins. Good for overlays that paint on black.
+     - multiply: The colors below are filtered by the layer, e.g. for a mask.
+    On top of this, each layer has an opacity for the entire layer.
+
+    The blending runs over the entire strip at once (see module bytemath). The result
+    after each layer is kept: If the lower layers did not change since the last frame,
+    blending starts at the first changed layer. If no layer changed, nothing is blended.
+    """
+
+    def __init__(self, num_led, layers=(), **kwargs):
+        """Initializes the compositor
+
+        :param layers: List of (color cycle, blend mode, opacity). See add_layer.
+        :param kwargs: All other arguments are the ones of ColorCycleTemplate
+        """
+        super().__init__(num_led, **kwargs)
+        self.layers = []
+        self.composites = []  # The colors after each layer
+        for layer in layers:
+            self.add_layer(*layer)
+
+    def add_layer(self, effect, blend='alpha', opacity=1.0):
+        """Puts a color cycle on top of the others
+
+        :param effect: The color cycle, an object of a ColorCycleTemplate subclass with the same num_led.
+                       Its num_steps_per_cycle applies, its bus and timing parameters are ignored.
+        :param blend: How to combine the colors with the ones below, see BLEND_MODES
+        :param opacity: Opacity of the entire layer, from 0.0 to 1.0
+        """
+        self.layers.append(Layer(effect, self.num_led, blend, opacity))
+        self.composites = []  # Blend everything again
+
+    def init(self, strip, num_led):
+        for layer in self.layers:
+            layer.effect.init(layer.strip, num_led)
+
+    def shutdown(self, strip, num_led):
+        for layer in self.layers:
+            layer.effect.shutdown(layer.strip, num_led)
+
+    def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
+        changed = [layer.update() for layer in self.layers]
+        first = len(self.composites)  # Layers from here on are blended again
+        if True in changed:
+            first = min(first, changed.index(True))
+        if first == len(self.layers):
+            return 0  # Nothing changed, no repaint necessary
+        del self.composites[first:]
+        colors = self.composites[-1] if self.composites else bytes(3 * num_led)
+        for layer in self.layers[first:]:
+            colors = layer.compose(colors)
+            self.composites.append(colors)
+        strip.set_pixels(colors)
+        return 1
+
@@ -0,0 +1,82 @@
+"""The module contains the colour correction: Gamma, white balance and colour temperature"""
+import math
+
+# Colour temperature in Kelvin, at which the correction factors are 1.0 for all channels
+NEUTRAL_TEMPERATURE = 6600
+
+
+def temperature_factors(kelvin):
+    """Returns the factors for red, green and blue (0.0 to 1.0) that tint white to a colour temperature.
+
+    This is the usual approximation of the black body colours from 1000 to 40000 Kelvin.
+    Lower temperatures are warmer (more red), higher temperatures colder (more blue).
+    """
+    if not 1000 <= kelvin <= 40000:
+        raise ValueError("Illegal color_temperature must be from 1000 to 40000 Kelvin")
+    temperature = kelvin / 100.0
+    if temperature <= 66:
+        red = 255.0
+        green = 99.4708025861 * math.log(temperature) - 161.1195681661
+    else:
+        red = 329.698727446 * (temperature - 60) ** -0.1332047592
+        green = 288.1221695283 * (temperature - 60) ** -0.0755148492
+    if temperature >= 66:
+        blue = 255.0
+    elif temperature <= 19:
+        blue = 0.0
+    else:
+        blue = 138.5177312231 * math.log(temperature - 10) - 305.0447927307
+    return [min(max(channel, 0.0), 255.0) / 255.0 for channel in (red, green, blue)]
+
+
+def channel_factors(white_balance=None, color_temperature=None):
+    """Returns the combined factors for red, green and blue of white balance and colour temperature."""
+    factors = [1.0, 1.0, 1.0]
+    if white_balance is not None:
+        if len(white_balance) != 3 or not all(0.0 <= factor <= 1.0 for factor in white_balance):
+            raise ValueError("Illegal white_balance must be three factors from 0.0 to 1.0")
+        factors = [factor * balance for factor, balance in zip(factors, white_balance)]
+    if color_temperature is not None:
+        factors = [factor * tint for factor, tint in zip(factors, temperature_factors(color_temperature))]
+    return factors
+
+
+def correction_curves(gamma=None, white_balance=None, color_temperature=None):
+    """Returns the corrected levels (0.0 to 1.0) of the 256 values of red, green and blue, or None.
+
+    Level v of a channel is (v / 255) ** gamma, times the factor of the channel. None
+    means that nothing is corrected.
+    """
+    if gamma is None and white_balance is None and color_temperature is None:
+        return None
+    if gamma is None:
+        gamma = 1.0
+    if gamma <= 0:
+        raise ValueError("Illegal gamma must be greater than 0")
+    curve = [(value / 255.0) ** gamma for value in range(256)]
+    return [[level * factor for level in curve] for factor in channel_factors(white_balance, color_temperature)]
+
+
+def correction_tables(gamma=None, white_balance=None, color_temperature=None):
+    """Returns three 256 byte translation tables for red, green and blue, or None if nothing is corrected.
+
+    Entry v of a table is the corrected value of the 8 bit value v, rounded to the nearest
+    integer. The tables are meant for bytes.translate.
+    """
+    curves = correction_curves(gamma, white_balance, color_temperature)
+    if curves is None:
+        return None
+    return [bytes(int(round(255 * level)) for level in curve) for curve in curves]
+
+
+def dither_tables(gamma=None, white_balance=None, color_temperature=None):
+    """Returns the same as correction_tables, but as lists of 16 bit values with 8 bits of fraction.
+
+    Entry v of a table is 256 times the corrected value of v. The upper byte is the value
+    that is sent, the lower byte the remainder, which temporal dithering carries over to the
+    next frames.
+    """
+    curves = correction_curves(gamma, white_balance, color_temperature)
+    if curves is None:
+        return None
+    return [[int(round(255 * 256 * level)) for level in curve] for curve in curves]
@@ -0,0 +1,98 @@
+"""The module contains a cache for encoded frames"""
+import mmap
+import os
+from collections import OrderedDict
+
+
+class FrameCache:
+    """Keeps encoded frames (the bytes that are sent to the strip), to send them again without rendering.
+
+    The cache holds at most max_bytes of frames in memory. When it is full, the least
+    recently used frame is evicted. If a spill file is set, evicted frames are moved into
+    this file instead, which is mapped into memory with mmap, up to spill_bytes. The
+    operating system pages the file in and out as needed, so the spilled frames cost no
+    Python memory. A frame from the spill file is copied out of the page cache when used.
+    The spill file only lives as long as the cache: It is overwritten when the cache is
+    created, and removed by close.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, spill_file=None, spill_bytes=64 * 1024 * 1024):
+        """Initializes the cache
+
+        :param max_bytes: Memory for frames
+        :param spill_file: Path of a file to move evicted frames into. Default is to drop them. The file
+                           is removed by close.
+        :param spill_bytes: Size of the spill file
+        """
+        if max_bytes <= 0:
+            raise ValueError("Illegal max_bytes must be greater than 0")
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()  # In the order of use, the least recently used first
+        self.size = 0  # Bytes in memory
+        self.hits = 0  # For monitoring: Number of frames found in the cache
+        self.misses = 0  # For monitoring: Number of frames that had to be rendered
+        self.spill = None
+        self.spill_file = spill_file
+        self.spilled = {}  # Position and length of the frames in the spill file
+        self.spill_size = 0  # Bytes in the spill file
+        if spill_file is not None:
+            with open(spill_file, 'w+b') as spill:
+                spill.truncate(spill_bytes)
+                self.spill = mmap.mmap(spill.fileno(), spill_bytes)
+
+    def __len__(self):
+        return len(self.frames) + len(self.spilled)
+
+    def get(self, key):
+        """Returns the frame for key, or None if it is not in the cache."""
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+        elif key in self.spilled:
+            position, length = self.spilled[key]
+            frame = self.spill[position:position + length]
+        if frame is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        """Adds a frame (bytes) to the cache. A frame larger than max_bytes only goes to the spill file."""
+        if key in self.frames:
+            self.size -= len(self.frames.pop(key))
+        if len(frame) > self.max_bytes:
+            self.spill_frame(key, frame)
+            return
+        self.frames[key] = frame
+        self.size += len(frame)
+        while self.size > self.max_bytes:
+            evicted_key, evicted = self.frames.popitem(last=False)
+            self.size -= len(evicted)
+            self.spill_frame(evicted_key, evicted)
+
+    def spill_frame(self, key, frame):
+        """Internal method: Moves a frame into the spill file, if there is one and if it has room."""
+        if self.spill is None or key in self.spilled or self.spill_size + len(frame) > len(self.spill):
+            return
+        self.spill[self.spill_size:self.spill_size + len(frame)] = frame
+        self.spilled[key] = (self.spill_size, len(frame))
+        self.spill_size += len(frame)
+
+    def clear(self):
+        """Removes all frames."""
+        self.frames.clear()
+        self.size = 0
+        self.spilled.clear()
+        self.spill_size = 0
+
+    def close(self):
+        """Removes all frames, and removes the spill file."""
+        self.clear()
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+            try:
+                os.remove(self.spill_file)
+            except FileNotFoundError:
+                pass  # Removed by someone else already
@@ -0,0 +1,122 @@
+"""The module contains a scheduler for a steady frame rate"""
+import time
+
+LATE_POLICIES = ['skip', 'catchup']
+
+
+class FrameScheduler:
+    """Paces a light program to a fixed number of frames per second.
+
+    Every frame has a deadline on the monotonic clock: The start time plus the frame
+    number times the frame period. After a frame has been rendered and shown, wait()
+    sleeps only for the time that is left until the next deadline. The time spent on
+    rendering and on the SPI transfer is thereby subtracted from the pause, and the frame
+    rate does not drift when the load changes.
+
+    If a frame is late (i.e. its deadline has passed already), one of two policies applies:
+     - skip: Continue with the frame that is due now. The steps in between are skipped,
+       so the program stays in time, but can stutter.
+     - catchup: Render all the missed frames without pausing, until the program is in
+       time again. Every step is shown, but for a short while faster than normal.
+
+    To keep several controllers in sync, use align: The frames are then aligned to the
+    wall clock (which must be synchronized, e.g. with NTP), and frame_number counts the
+    frames since the epoch. All controllers that use the same frame rate show the same
+    frame number at the same time. The deadlines follow the monotonic clock, which runs
+    slightly faster or slower than the wall clock. Therefore, the frames are aligned to the
+    wall clock again every realign seconds, so that controllers don't drift apart over a
+    long show. If the wall clock is set back, the scheduler waits until it has caught up.
+    """
+
+    def __init__(self, fps, late_policy='skip', align=False, realign=10.0):
+        """Initializes the scheduler
+
+        :param fps: Target number of frames per second
+        :param late_policy: What to do with late frames: skip or catchup
+        :param align: Align the frames to the wall clock, to keep several controllers in sync
+        :param realign: With align, seconds after which the frames are aligned to the wall clock again
+        """
+        if fps <= 0:
+            raise ValueError("Illegal fps must be greater than 0")
+        if late_policy not in LATE_POLICIES:
+            raise ValueError("Illegal late_policy not in %s" % LATE_POLICIES)
+        self.period = 1.0 / fps
+        self.late_policy = late_policy
+        self.align = align
+        self.realign = realign
+        self.epoch = None  # Monotonic time of frame 0
+        self.aligned_at = None  # With align: Monotonic time of the last alignment
+        self.frame_number = 0  # The frame that is currently being rendered
+        self.late_frames = 0  # Number of frames that missed their deadline
+
+    def start(self):
+        """Starts the clock. Returns the number of the first frame.
+
+        Without align, this is always zero. With align, the first frame is the next one on
+        the wall clock, and rendering should wait for it (see wait).
+        """
+        now = time.monotonic()
+        if self.align:
+            wall_clock = self.align_epoch(now)
+            self.frame_number = int(wall_clock / self.period) + 1
+        else:
+            self.frame_number = 0
+            self.epoch = now
+        return self.frame_number
+
+    def align_epoch(self, now):
+        """Internal method: Aligns frame 0 to the wall clock. Returns the wall clock time."""
+        wall_clock = time.time()
+        # Monotonic time that corresponds to frame 0 on the wall clock
+        self.epoch = now - wall_clock
+        self.aligned_at = now
+        return wall_clock
+
+    def deadline(self, frame_number):
+        """Returns the monotonic time at which frame_number is due."""
+        return self.epoch + frame_number * self.period
+
+    def delay_until(self, frame_number):
+        """Returns the time in seconds until frame_number is due, or zero if it is already late."""
+        return max(self.deadline(frame_number) - time.monotonic(), 0)
+
+    def sleep_until(self, frame_number):
+        """Sleeps until frame_number is due. Returns immediately if it is already late."""
+        remaining = self.delay_until(frame_number)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def wait(self):
+        """Waits for the next frame. Returns by how many frames the program must advance.
+
+        This is 1, unless frames are late and the policy is skip. Then it is 1 plus the
+        number of skipped frames.
+        """
+        advance, delay = self.next_frame()
+        if delay > 0:
+            time.sleep(delay)
+        return advance
+
+    def next_frame(self):
+        """Moves on to the next frame, without waiting for it.
+
+        Returns a tuple: By how many frames the program must advance (see wait), and
+        how many seconds are left until that frame is due. This is what wait uses, and
+        allows to wait some other way, e.g. with asyncio.sleep.
+        """
+        if self.epoch is None:
+            self.start()
+        next_frame = self.frame_number + 1
+        now = time.monotonic()
+        if self.align and now - self.aligned_at >= self.realign:
+            self.align_epoch(now)
+        delay = self.deadline(next_frame) - now
+        if delay <= 0:
+            delay = 0
+            self.late_frames += 1
+            if self.late_policy == 'skip':
+                # Continue with the frame that is due now
+                next_frame = max(next_frame, int((now - self.epoch) / self.period))
+        advance = next_frame - self.frame_number
+        self.frame_number = next_frame
+        return advance, delay
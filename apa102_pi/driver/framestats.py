@@ -0,0 +1,138 @@
+"""The module contains the frame timing statistics"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+STAGES = ['sleep', 'render', 'encode', 'lock', 'transmit']
+# Upper bounds of the histogram buckets in seconds, from 0.1 ms to 1 s. The last bucket has no upper bound.
+BUCKETS = [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+
+class FrameStats:
+    """Collects how long each stage of a frame takes, to find out what limits the frame rate.
+
+    The stages of a frame are:
+     - sleep: Pause before the frame (recorded by ColorCycleTemplate)
+     - render: Painting the pixel buffer, i.e. update() (recorded by ColorCycleTemplate)
+     - encode: Preparing the frame for the strip (recorded by APA102.show)
+     - lock: Waiting for the bus lock (recorded by APA102.show)
+     - transmit: Writing the frame to the bus (recorded by APA102.show)
+
+    A frame ends with every show of the strip. With a threaded strip, lock and transmit happen
+    in the background: show takes the timings of its frame along to the transmit thread (see
+    take_frame), which adds lock and transmit, and then ends the frame. The methods can be
+    called from several threads.
+
+    The last window frames are kept for every stage, and are available as mean, percentiles
+    and histogram. Frame rate and jitter (the standard deviation of the time between two
+    frames) are computed from the same window.
+
+    Functions added with add_hook are called at the end of every frame, with a dictionary
+    of the stage timings of this frame. If log_interval is set, a summary is logged every
+    log_interval seconds.
+
+    To keep the overhead at zero when the statistics are not used, the driver and the
+    template only call into this class if a FrameStats object is passed to them.
+    """
+
+    def __init__(self, window=1000, log_interval=None):
+        """Initializes the statistics
+
+        :param window: Number of frames to keep
+        :param log_interval: If set, log a summary every log_interval seconds
+        """
+        self.window = window
+        self.log_interval = log_interval
+        self.timings = {stage: deque(maxlen=window) for stage in STAGES}
+        self.frame_times = deque(maxlen=window + 1)  # End of the last frames, on the monotonic clock
+        self.frame_count = 0
+        self.current = {}  # Stage timings of the frame in progress
+        self.hooks = []
+        self.last_log = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds, frame=None):
+        """Adds the duration of a stage to the frame in progress, or to a frame from take_frame."""
+        with self.lock:
+            if frame is None:
+                frame = self.current
+            frame[stage] = frame.get(stage, 0.0) + seconds
+
+    def take_frame(self):
+        """Returns the stage timings of the frame in progress, and starts the next one.
+
+        The returned frame can still be recorded into, and must be ended with frame_done.
+        """
+        with self.lock:
+            frame, self.current = self.current, {}
+        return frame
+
+    def add_hook(self, hook):
+        """Adds a function that is called with the stage timings at the end of every frame."""
+        self.hooks.append(hook)
+
+    def frame_done(self, frame=None):
+        """Ends the frame in progress, or a frame from take_frame."""
+        if frame is None:
+            frame = self.take_frame()
+        now = time.monotonic()
+        with self.lock:
+            for stage, seconds in frame.items():
+                self.timings[stage].append(seconds)
+            self.frame_times.append(now)
+            self.frame_count += 1
+        for hook in self.hooks:
+            hook(frame)
+        if self.log_interval is not None and now - self.last_log >= self.log_interval:
+            self.last_log = now
+            self.log()
+
+    def fps(self):
+        """Returns the average frame rate over the window."""
+        if len(self.frame_times) < 2:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def jitter(self):
+        """Returns the standard deviation of the time between two frames in seconds."""
+        intervals = [later - earlier for earlier, later in zip(self.frame_times, list(self.frame_times)[1:])]
+        if len(intervals) < 2:
+            return 0.0
+        mean = sum(intervals) / len(intervals)
+        return math.sqrt(sum((interval - mean) ** 2 for interval in intervals) / len(intervals))
+
+    def percentile(self, stage, percent):
+        """Returns the duration in seconds that percent of the frames did not exceed for a stage."""
+        timings = sorted(self.timings[stage])
+        if not timings:
+            return 0.0
+        return timings[min(int(len(timings) * percent / 100.0), len(timings) - 1)]
+
+    def histogram(self, stage):
+        """Returns the number of frames per bucket for a stage. See BUCKETS for the bucket bounds."""
+        counts = [0] * (len(BUCKETS) + 1)
+        for seconds in self.timings[stage]:
+            bucket = 0
+            while bucket < len(BUCKETS) and seconds > BUCKETS[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+        return counts
+
+    def summary(self):
+        """Returns frame rate, jitter, and mean, median, 95th percentile and maximum of every stage."""
+        stages = {}
+        for stage, timings in self.timings.items():
+            if timings:
+                stages[stage] = {'mean': sum(timings) / len(timings), 'p50': self.percentile(stage, 50),
+                                 'p95': self.percentile(stage, 95), 'max': max(timings)}
+        return {'frames': self.frame_count, 'fps': self.fps(), 'jitter': self.jitter(), 'stages': stages}
+
+    def log(self):
+        """Logs a summary."""
+        summary = self.summary()
+        stages = ', '.join('%s %.2f/%.2f ms' % (stage, values['mean'] * 1000, values['p95'] * 1000)
+                           for stage, values in summary['stages'].items())
+        logging.info("%d frames, %.1f fps, jitter %.2f ms; mean/p95: %s", summary['frames'], summary['fps'],
+                     summary['jitter'] * 1000, stages)
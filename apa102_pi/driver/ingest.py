@@ -0,0 +1,161 @@
+"""The module contains a server that receives pixels over the network"""
+import logging
+import socket
+import struct
+import threading
+import time
+
+# Every packet starts with this header: Magic, type, flags, universe and sequence number (ignored)
+HEADER = struct.Struct('>2sBBHH')
+MAGIC = b'AP'
+TYPE_RGB = 1  # Payload: 3 bytes red, green and blue per LED
+TYPE_FRAMES = 2  # Payload: LED frames as in the pixel buffer, 4 bytes per LED in the color order of the strip
+TYPE_SYNC = 3  # No payload: Show the pixels received so far
+FLAG_PUSH = 0x01  # Show the pixels right after this packet
+DEFAULT_PORT = 7777
+LEDS_PER_UNIVERSE = 170  # As in E1.31 and Art-Net: 512 DMX channels hold 170 RGB pixels
+MAX_PACKET = 65536
+# Sets the three bits that start every LED frame. Without them, the strip would take the byte for a color.
+LED_START_BITS = bytes(value | 0b11100000 for value in range(256))
+
+
+class IngestServer:
+    """Receives pixels from a show controller over UDP, and shows them on a strip.
+
+    The protocol is a compact variant of E1.31 / Art-Net. A packet consists of an 8 byte
+    header (see HEADER), followed by the pixels of one universe. Universe u starts at
+    LED u * leds_per_universe. There are three types of packets:
+     - TYPE_RGB: 3 bytes per LED. They are copied into the pixel buffer with set_pixels.
+     - TYPE_FRAMES: 4 bytes per LED, exactly as in the pixel buffer (brightness first, then
+       the colors in the order of the strip). The socket writes them straight into the pixel
+       buffer: The header is peeked at first, then the packet is received with recvmsg_into
+       into the header and the part of the pixel buffer it belongs to. The three bits that
+       start an LED frame are set afterwards, whatever the packet contained. Only for APA102 strips.
+     - TYPE_SYNC: Shows the pixels that were received so far. This way, several universes
+       go to the strip at the same time.
+    A packet with FLAG_PUSH is shown right away, e.g. if the entire frame fits into one packet.
+
+    If max_latency is set, pixels that are not followed by a sync packet are shown after at
+    most max_latency seconds, e.g. if the sync packet got lost.
+
+    An error while receiving or showing a packet is logged and counted in errors, and
+    serve_forever goes on with the next packet.
+    """
+
+    def __init__(self, strip, host='0.0.0.0', port=DEFAULT_PORT, leds_per_universe=LEDS_PER_UNIVERSE,
+                 max_latency=None):
+        """Initializes the server, and opens the socket
+
+        :param strip: The strip to show the pixels on
+        :param host: Address to listen on
+        :param port: UDP port to listen on. 0 picks a free port, see address.
+        :param leds_per_universe: Number of LEDs from the start of one universe to the next
+        :param max_latency: Seconds after which received pixels are shown without a sync packet
+        """
+        if leds_per_universe <= 0:
+            raise ValueError("Illegal leds_per_universe must be greater than 0")
+        self.strip = strip
+        self.leds_per_universe = leds_per_universe
+        self.max_latency = max_latency
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.address = self.socket.getsockname()
+        self.header = bytearray(HEADER.size)
+        self.buffer = bytearray(MAX_PACKET)  # Receives the packets that are not written into the pixel buffer
+        self.pending = None  # Monotonic time of the first pixels that were not shown yet
+        self.packets = 0  # For monitoring: Number of packets received
+        self.errors = 0  # For monitoring: Number of packets that were ignored or failed
+        self.thread = None
+        self.running = True  # Until stop is called
+
+    def handle_packet(self, timeout=None):
+        """Receives and processes one packet. Returns False if none arrived within timeout seconds."""
+        self.socket.settimeout(timeout)
+        try:
+            received = self.socket.recv_into(self.header, HEADER.size, socket.MSG_PEEK)
+        except socket.timeout:
+            return False
+        self.packets += 1
+        if received < HEADER.size or self.header[:2] != MAGIC:
+            self.socket.recv_into(self.buffer)  # Drop it
+            self.errors += 1
+            return True
+        _, kind, flags, universe, _ = HEADER.unpack(self.header)
+        start = universe * self.leds_per_universe
+        if kind == TYPE_FRAMES and not hasattr(self.strip, 'segments'):
+            # No pixel buffer to receive into, e.g. a MultiStrip
+            self.socket.recv_into(self.buffer)  # Drop it
+            self.errors += 1
+            return True
+        if kind == TYPE_FRAMES:
+            self.receive_frames(start)
+        else:
+            length = self.socket.recv_into(self.buffer)
+            if kind == TYPE_RGB:
+                self.strip.set_pixels(memoryview(self.buffer)[HEADER.size:length], start)
+            elif kind == TYPE_SYNC:
+                self.show()
+                return True
+            else:
+                self.errors += 1
+                return True
+        if flags & FLAG_PUSH:
+            self.show()
+        elif self.pending is None:
+            self.pending = time.monotonic()
+        return True
+
+    def receive_frames(self, start):
+        """Internal method: Receives a packet of LED frames straight into the pixel buffer"""
+        strip = self.strip
+        buffers = [self.header]
+        try:
+            if start < strip.num_led:
+                # The pixel buffer can wrap around, see APA102.rotate
+                buffers += [strip.leds[4 * physical:4 * (physical + count)]
+                            for physical, _, count in strip.segments(start, strip.num_led)]
+        except Exception:
+            self.socket.recv_into(self.buffer)  # Drop the packet, it was only peeked at
+            raise
+        buffers.append(self.buffer)  # Takes whatever does not fit on the strip
+        received = self.socket.recvmsg_into(buffers)[0]
+        # An LED that only got some of its 4 bytes counts as well: Its first byte may have changed
+        count = min((received - HEADER.size + 3) // 4, strip.num_led - start)
+        if count > 0:
+            for physical, _, length in strip.segments(start, start + count):
+                low, high = 4 * physical, 4 * (physical + length)
+                strip.leds[low:high:4] = strip.leds[low:high:4].tobytes().translate(LED_START_BITS)
+            strip.mark_dirty(start, start + count)
+
+    def show(self):
+        """Internal method: Shows the received pixels"""
+        self.pending = None
+        self.strip.show()
+
+    def serve_forever(self):
+        """Receives and shows packets until stop is called."""
+        while self.running:
+            timeout = 0.5  # Check for stop every now and then
+            if self.pending is not None and self.max_latency is not None:
+                timeout = max(self.pending + self.max_latency - time.monotonic(), 0.0)
+            try:
+                if not self.handle_packet(timeout) and self.pending is not None and self.max_latency is not None:
+                    if time.monotonic() - self.pending >= self.max_latency:
+                        self.show()  # The sync packet is overdue
+            except Exception:
+                self.errors += 1
+                logging.exception("Ingest: Failed to receive or show a packet")
+
+    def start(self):
+        """Starts serve_forever in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, name='apa102-ingest', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops serving, and closes the socket."""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.socket.close()
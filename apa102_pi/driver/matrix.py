@@ -0,0 +1,149 @@
+"""The module contains a two-dimensional view on an LED strip"""
+from array import array
+
+from apa102_pi.driver import apa102
+
+ROTATIONS = [0, 90, 180, 270]
+
+
+class Matrix:
+    """A matrix view on a strip, for LED walls and panels.
+
+    The LEDs of a matrix are still one long strip, wired row by row (or column by column),
+    often in a serpentine way, possibly across several panels. This class maps x and y
+    coordinates to the number of the LED on the strip, with x going to the right and
+    y going down, starting at the top left corner.
+
+    The layout is compiled once into an index map. A full frame (width * height pixels,
+    row by row, 3 bytes red, green and blue per pixel) is copied onto the strip in one
+    go with blit: The pixels are reordered with the index map as 32 bit words, and then
+    handed to set_pixels. This works on an APA102 as well as on a MultiStrip.
+
+    Layout parameters:
+     - serpentine: Every other row runs in the opposite direction
+     - vertical: The LEDs are wired column by column instead of row by row
+     - rotation: The wiring starts in the top left corner (0), top right (90), bottom right (180)
+       or bottom left (270), i.e. the panel is mounted rotated clockwise by this many degrees
+     - panel_width, panel_height: The matrix is tiled from panels of this size. The panels are
+       chained row by row, each one with the layout above. Default is one single panel.
+     - panel_serpentine: Every other row of panels runs in the opposite direction
+    """
+
+    def __init__(self, strip, width, height, serpentine=False, vertical=False, rotation=0, panel_width=None,
+                 panel_height=None, panel_serpentine=False, start=0):
+        """Initializes the matrix
+
+        :param strip: The strip to paint on, e.g. an APA102 or a MultiStrip
+        :param width: Number of pixels per row
+        :param height: Number of rows
+        :param start: Number of the first LED of the matrix on the strip
+        """
+        panel_width = panel_width or width
+        panel_height = panel_height or height
+        if width <= 0 or height <= 0:
+            raise ValueError("Illegal width and height can not be 0 or less")
+        if rotation not in ROTATIONS:
+            raise ValueError("Illegal rotation not in %s" % ROTATIONS)
+        if width % panel_width or height % panel_height:
+            raise ValueError("Illegal panel size does not divide the matrix size")
+        if start < 0 or start + width * height > strip.num_led:
+            raise ValueError("Illegal matrix size larger than the strip")
+        self.strip = strip
+        self.width = width
+        self.height = height
+        self.start = start
+        # For every LED of the matrix, the position (y * width + x) of its pixel in a frame
+        self.pixel_map = self.compile_layout(width, height, serpentine, vertical, rotation, panel_width,
+                                             panel_height, panel_serpentine)
+        # The other way round: For every pixel, the number of its LED on the strip
+        self.led_map = [0] * len(self.pixel_map)
+        for led, pixel in enumerate(self.pixel_map):
+            self.led_map[pixel] = start + led
+
+    @staticmethod
+    def compile_layout(width, height, serpentine, vertical, rotation, panel_width, panel_height,
+                       panel_serpentine):
+        """Internal method: Returns the position of the pixel in a frame for every LED of the matrix."""
+        panels_x = width // panel_width
+        per_panel = panel_width * panel_height
+        # Size of a panel as it is wired, i.e. before it is rotated
+        wired_width, wired_height = panel_width, panel_height
+        if rotation in (90, 270):
+            wired_width, wired_height = panel_height, panel_width
+        pixel_map = []
+        for led in range(width * height):
+            panel, index = divmod(led, per_panel)
+            panel_y, panel_x = divmod(panel, panels_x)
+            if panel_serpentine and panel_y % 2:
+                panel_x = panels_x - 1 - panel_x
+            if vertical:
+                column, row = divmod(index, wired_height)
+                if serpentine and column % 2:
+                    row = wired_height - 1 - row
+            else:
+                row, column = divmod(index, wired_width)
+                if serpentine and row % 2:
+                    column = wired_width - 1 - column
+            if rotation == 0:
+                x, y = column, row
+            elif rotation == 90:
+                x, y = wired_height - 1 - row, column
+            elif rotation == 180:
+                x, y = wired_width - 1 - column, wired_height - 1 - row
+            else:
+                x, y = row, wired_width - 1 - column
+            pixel_map.append((panel_y * panel_height + y) * width + panel_x * panel_width + x)
+        return pixel_map
+
+    def led_number(self, x, y):
+        """Returns the number of the LED at x, y on the strip, or None if it is outside of the matrix."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.led_map[y * self.width + x]
+        return None
+
+    def set_pixel(self, x, y, red, green, blue, bright_percent=100):
+        """Sets the color of one pixel. Pixels outside of the matrix are ignored."""
+        led_num = self.led_number(x, y)
+        if led_num is not None:
+            self.strip.set_pixel(led_num, red, green, blue, bright_percent)
+
+    def set_pixel_rgb(self, x, y, rgb_color, bright_percent=100):
+        """Sets the color of one pixel. Colors are passed combined (3 bytes concatenated)"""
+        led_num = self.led_number(x, y)
+        if led_num is not None:
+            self.strip.set_pixel_rgb(led_num, rgb_color, bright_percent)
+
+    def get_pixel_rgb(self, x, y):
+        """Gets the color of one pixel, see APA102.get_pixel_rgb."""
+        led_num = self.led_number(x, y)
+        if led_num is not None:
+            return self.strip.get_pixel_rgb(led_num)
+
+    def fill(self, rgb_color, bright_percent=100):
+        """Sets all pixels of the matrix to the same color."""
+        self.strip.set_range(self.start, self.start + self.width * self.height, rgb_color, bright_percent)
+
+    def blit(self, pixels, bright_percent=100):
+        """Copies a full frame onto the matrix.
+
+        pixels is anything that supports the buffer protocol, with 3 bytes red, green and
+        blue per pixel, row by row: E.g. bytes, or a (height, width, 3) uint8 NumPy array.
+        """
+        colors = apa102.color_buffer(pixels)
+        count = self.width * self.height
+        if len(colors) != 3 * count:
+            raise ValueError("Illegal pixels must contain %d bytes" % (3 * count))
+        # Pad every pixel to a 32 bit word, so that a pixel can be moved as one item
+        words = bytearray(4 * count)
+        for channel in range(3):
+            words[channel::4] = colors[channel::3]
+        words = memoryview(words).cast('I')
+        leds = memoryview(array('I', map(words.__getitem__, self.pixel_map))).cast('B')
+        ordered = bytearray(3 * count)
+        for channel in range(3):
+            ordered[channel::3] = leds[channel::4]
+        self.strip.set_pixels(ordered, self.start, bright_percent)
+
+    def show(self, force=False):
+        """Sends the pixel buffer to the strip, see APA102.show"""
+        self.strip.show(force)
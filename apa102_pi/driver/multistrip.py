@@ -0,0 +1,206 @@
+"""The module contains a controller that drives several strips as one"""
+from concurrent.futures import ThreadPoolExecutor
+
+from apa102_pi.driver import apa102
+
+
+class MultiStrip:
+    """Drives several APA102 strips (outputs) as one long, logical strip.
+
+    Every output is an APA102 object of its own, e.g. one on SPI0, one on SPI1 and
+    some bitbang chains. Logical LED i is mapped to an LED on one of the outputs. By
+    default, the outputs are simply concatenated: First all LEDs of output 0, then all
+    LEDs of output 1, and so on. A mapping can be passed to lay out the LEDs in any order.
+
+    The pixel methods are the ones of APA102, so a color cycle can paint on a MultiStrip
+    like on a single strip (see the strip parameter of ColorCycleTemplate). show sends
+    all outputs at the same time, one thread per output, and returns once the last one is
+    done. A frame therefore takes as long as the longest output, not the sum of all outputs.
+    """
+
+    def __init__(self, outputs, mapping=None, max_workers=None):
+        """Initializes the controller
+
+        :param outputs: List of APA102 objects. The controller owns them, i.e. cleanup cleans them up.
+        :param mapping: List of (output index, led number) pairs, one per logical LED. Default is to
+                        concatenate the outputs.
+        :param max_workers: Number of threads to send the frames. Default is one per output.
+        """
+        if not outputs:
+            raise ValueError("Illegal outputs can not be empty")
+        self.outputs = list(outputs)
+        if mapping is None:
+            mapping = [(output, led) for output, strip in enumerate(self.outputs) for led in range(strip.num_led)]
+        self.lookup = []  # Output and LED number for every logical LED
+        for output, led in mapping:
+            if not 0 <= output < len(self.outputs) or not 0 <= led < self.outputs[output].num_led:
+                raise ValueError("Illegal mapping (%s, %s) not on an output" % (output, led))
+            self.lookup.append((self.outputs[output], led))
+        self.num_led = len(self.lookup)
+        if self.num_led == 0:
+            raise ValueError("Illegal mapping can not be empty")
+        self.runs = self.compile_runs()
+        self.rgb = self.outputs[0].rgb  # Color order of the LED frames in rotate
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(self.outputs),
+                                           thread_name_prefix='apa102-multistrip')
+
+    def compile_runs(self):
+        """Internal method: Splits the mapping into runs of LEDs that are consecutive on one output.
+
+        Returns a list of (first logical LED, number of LEDs, output, first LED on the output).
+        With the default mapping, there is exactly one run per output. The bulk methods copy
+        one run at a time, instead of one LED at a time.
+        """
+        runs = []
+        for logical, (strip, led) in enumerate(self.lookup):
+            if runs:
+                first, count, run_strip, run_led = runs[-1]
+                if run_strip is strip and run_led + count == led:
+                    runs[-1] = (first, count + 1, strip, run_led)
+                    continue
+            runs.append((logical, 1, strip, led))
+        return runs
+
+    def pieces(self, start, stop):
+        """Internal method: Splits the logical LEDs from start up to stop into pieces on the outputs.
+
+        Returns a list of (logical LED, number of LEDs, output, LED on the output). The LEDs
+        must be on the strip.
+        """
+        pieces = []
+        for first, count, strip, led in self.runs:
+            low = max(first, start)
+            high = min(first + count, stop)
+            if low < high:
+                pieces.append((low, high - low, strip, led + low - first))
+        return pieces
+
+    def mapped(self, led_num):
+        """Internal method: Returns the output and LED number of a logical LED."""
+        return self.lookup[led_num]
+
+    def set_pixel(self, led_num, red, green, blue, bright_percent=100):
+        """Sets the color of one pixel, see APA102.set_pixel."""
+        if 0 <= led_num < self.num_led:
+            strip, led = self.mapped(led_num)
+            strip.set_pixel(led, red, green, blue, bright_percent)
+
+    def set_pixel_rgb(self, led_num, rgb_color, bright_percent=100):
+        """Sets the color of one pixel, see APA102.set_pixel_rgb."""
+        if 0 <= led_num < self.num_led:
+            strip, led = self.mapped(led_num)
+            strip.set_pixel_rgb(led, rgb_color, bright_percent)
+
+    def get_pixel(self, led_num):
+        """Gets the color and brightness of one pixel, see APA102.get_pixel."""
+        if 0 <= led_num < self.num_led:
+            strip, led = self.mapped(led_num)
+            return strip.get_pixel(led)
+
+    def get_pixel_rgb(self, led_num):
+        """Gets the color of one pixel, see APA102.get_pixel_rgb."""
+        if 0 <= led_num < self.num_led:
+            strip, led = self.mapped(led_num)
+            return strip.get_pixel_rgb(led)
+
+    def fill(self, rgb_color, bright_percent=100):
+        """Sets all pixels to the same color."""
+        self.set_range(0, self.num_led, rgb_color, bright_percent)
+
+    def set_range(self, start, stop, rgb_color, bright_percent=100):
+        """Sets the pixels from start up to, but not including, stop to the same color."""
+        for _, count, strip, led in self.pieces(max(start, 0), min(stop, self.num_led)):
+            strip.set_range(led, led + count, rgb_color, bright_percent)
+
+    def set_pixels(self, pixels, start=0, bright_percent=100):
+        """Sets consecutive pixels from a buffer of colors, see APA102.set_pixels."""
+        colors = apa102.color_buffer(pixels)
+        skip = max(-start, 0)  # Pixels before the start of the strip
+        stop = min(start + len(colors) // 3, self.num_led)
+        for logical, count, strip, led in self.pieces(start + skip, stop):
+            strip.set_pixels(colors[3 * (logical - start):3 * (logical - start + count)], led, bright_percent)
+
+    def set_pixels_wheel(self, wheel_positions, start=0):
+        """Sets consecutive pixels to colors from the color wheel, see APA102.set_pixels_wheel."""
+        self.set_pixels(b''.join(map(apa102.WHEEL_PIXELS.__getitem__, wheel_positions)), start)
+
+    def rotate(self, positions=1):
+        """Rotate the LEDs by the specified number of positions, see APA102.rotate.
+
+        With a single output that holds all LEDs in its own order, this just moves the ring
+        offset of the output. Otherwise, LEDs move from one output to the next: The LED frames
+        of all runs are gathered into one buffer, rotated, and written back run by run. Only
+        the runs on an output with a different color order are reordered, with one slice per
+        channel.
+        """
+        positions %= self.num_led
+        if positions == 0:
+            return
+        first_run = self.runs[0]
+        if len(self.runs) == 1 and first_run[2].num_led == self.num_led:
+            first_run[2].rotate(positions)
+            return
+        frames = self.led_frames()
+        frames = frames[4 * positions:] + frames[:4 * positions]
+        for first, count, strip, led in self.runs:
+            strip.set_led_frames(self.reorder(frames[4 * first:4 * (first + count)], self.rgb, strip.rgb), led)
+
+    def led_frames(self):
+        """Internal method: Returns the LED frames of all logical LEDs, in the color order of the first output."""
+        frames = bytearray(4 * self.num_led)
+        for first, count, strip, led in self.runs:
+            run = b''.join(strip.leds[4 * physical:4 * (physical + length)]
+                           for physical, _, length in strip.segments(led, led + count))
+            frames[4 * first:4 * (first + count)] = self.reorder(run, strip.rgb, self.rgb)
+        return frames
+
+    @staticmethod
+    def reorder(frames, source, target):
+        """Internal method: Moves the colors of LED frames from one color order to another (see RGB_MAP)."""
+        if source == target:
+            return frames
+        reordered = bytearray(frames)
+        for channel in range(3):
+            reordered[target[channel]::4] = frames[source[channel]::4]
+        return reordered
+
+    @staticmethod
+    def combine_color(red, green, blue):
+        """Make one 3*8 byte color value."""
+        return apa102.APA102.combine_color(red, green, blue)
+
+    def wheel(self, wheel_pos):
+        """Get a color from a color wheel; Green -> Red -> Blue -> Green"""
+        return self.outputs[0].wheel(wheel_pos)
+
+    def run_all(self, method, *args):
+        """Internal method: Calls a method on all outputs in parallel, and waits until all are done.
+
+        This is the frame barrier: The next frame is only started once every output has sent
+        the current one. If an output fails, the error is raised once all outputs are done.
+        """
+        futures = [self.executor.submit(getattr(strip, method), *args) for strip in self.outputs]
+        for future in futures:
+            future.exception()  # Waits for the output
+        for future in futures:
+            future.result()  # Raises the first error, if any
+
+    def show(self, force=False):
+        """Sends the pixel buffers of all outputs to the strips at the same time."""
+        self.run_all('show', force)
+
+    def flush(self):
+        """Waits until all outputs sent their frames, see APA102.flush."""
+        self.run_all('flush')
+
+    def clear_strip(self):
+        """Turns off all strips and shows the result right away."""
+        self.fill(0)
+        self.show()
+
+    def cleanup(self):
+        """Releases all outputs; Call this method at the end"""
+        try:
+            self.run_all('cleanup')
+        finally:
+            self.executor.shutdown()
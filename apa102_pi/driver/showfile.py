@@ -0,0 +1,159 @@
+"""The module contains a file format for recorded shows, with a writer and a player"""
+import mmap
+import struct
+
+from apa102_pi.driver import framescheduler
+
+# The file starts with this header: Magic, version, frame rate, number of LEDs, number of frames and
+# bytes per frame. The frame rate is a double, so that e.g. 29.97 is read back exactly. The frames
+# follow right after the header, all of the same length.
+HEADER = struct.Struct('<4sHdIII')
+MAGIC = b'APAS'
+VERSION = 1
+
+
+class ShowWriter:
+    """Records a show into a file, frame by frame.
+
+    The frames are stored exactly as they are sent to the strip (see APA102.encoded_frame),
+    so that playing them back needs no work at all. Use it as a context manager, or call
+    close at the end: Only then is the number of frames written into the header.
+    """
+
+    def __init__(self, path, num_led, fps):
+        """Creates the file
+
+        :param path: Path of the file
+        :param num_led: Number of LEDs of the strip
+        :param fps: Frame rate of the show
+        """
+        if num_led <= 0:
+            raise ValueError("Illegal num_led can not be 0 or less")
+        if fps <= 0:
+            raise ValueError("Illegal fps must be greater than 0")
+        self.num_led = num_led
+        self.fps = fps
+        self.frame_length = None  # Known with the first frame
+        self.frame_count = 0
+        self.file = open(path, 'wb')
+        self.file.write(bytes(HEADER.size))  # Written on close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def write_frame(self, frame):
+        """Appends a frame, as returned by APA102.encoded_frame."""
+        if self.frame_length is None:
+            self.frame_length = len(frame)
+        if len(frame) != self.frame_length:
+            raise ValueError("Illegal frame of %d bytes, expected %d" % (len(frame), self.frame_length))
+        self.file.write(frame)
+        self.frame_count += 1
+
+    def write_strip(self, strip):
+        """Appends the current content of the pixel buffer of a strip as a frame."""
+        if strip.num_led != self.num_led:
+            raise ValueError("Illegal strip with %d LEDs, expected %d" % (strip.num_led, self.num_led))
+        self.write_frame(strip.encoded_frame())
+
+    def close(self):
+        """Writes the header, and closes the file."""
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.fps, self.num_led, self.frame_count,
+                                    self.frame_length or 0))
+        self.file.close()
+
+
+class ShowPlayer:
+    """Plays a recorded show (see ShowWriter) on a strip.
+
+    The file is mapped into memory with mmap, and every frame is handed to the strip as a
+    slice of the mapping (see APA102.show_frame). Nothing is converted or copied in Python,
+    and the operating system reads the file as it is played. Memory use is therefore the
+    same for a show of a few seconds and one of several hours. Use it as a context manager,
+    or call close at the end.
+    """
+
+    def __init__(self, path, strip):
+        """Opens a show
+
+        :param path: Path of the file
+        :param strip: The strip to play on. It must have the number of LEDs of the show.
+        """
+        with open(path, 'rb') as show:
+            self.mapping = mmap.mmap(show.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mapping) < HEADER.size:
+            self.mapping.close()
+            raise ValueError("Illegal show file without header")
+        magic, version, self.fps, self.num_led, self.frame_count, self.frame_length = \
+            HEADER.unpack_from(self.mapping)
+        if magic != MAGIC or version != VERSION:
+            self.mapping.close()
+            raise ValueError("Illegal show file, or version not supported")
+        if len(self.mapping) < HEADER.size + self.frame_count * self.frame_length:
+            self.mapping.close()
+            raise ValueError("Illegal show file, frames missing")
+        if strip.num_led != self.num_led:
+            self.mapping.close()
+            raise ValueError("Illegal strip with %d LEDs, the show has %d" % (strip.num_led, self.num_led))
+        self.strip = strip
+        self.position = 0  # The next frame to play
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    @property
+    def duration(self):
+        """Length of the show in seconds."""
+        return self.frame_count / self.fps
+
+    def frame(self, number):
+        """Returns a frame of the show, as a memoryview on the file."""
+        start = HEADER.size + number * self.frame_length
+        return memoryview(self.mapping)[start:start + self.frame_length]
+
+    def seek(self, seconds):
+        """Moves to the frame at a time from the start of the show."""
+        self.position = min(max(int(seconds * self.fps), 0), self.frame_count)
+
+    def show_frame(self, number):
+        """Sends one frame of the show to the strip."""
+        frame = self.frame(number)
+        try:
+            self.strip.show_frame(frame)
+        finally:
+            frame.release()  # Otherwise, the mapping can't be closed
+
+    def play(self, loop=False, duration=None):
+        """Plays the show from the current position, at the frame rate of the show
+
+        Late frames are skipped, so that the show stays in time (see FrameScheduler).
+
+        :param loop: Start over at the end of the show
+        :param duration: Seconds to play. Default is until the end of the show, or forever with loop.
+        """
+        if self.frame_count == 0:
+            return
+        scheduler = framescheduler.FrameScheduler(self.fps)
+        scheduler.start()
+        frames = None if duration is None else int(duration * self.fps)
+        while frames is None or scheduler.frame_number < frames:
+            if self.position >= self.frame_count:
+                if not loop:
+                    return
+                self.position %= self.frame_count
+            self.show_frame(self.position)
+            steps = scheduler.wait()
+            self.position += steps
+
+    def close(self):
+        """Closes the file."""
+        self.mapping.close()
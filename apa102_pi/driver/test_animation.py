@@ -0,0 +1,46 @@
+"""Tests for the animation engine"""
+from unittest import TestCase
+
+from apa102_pi.driver import animation
+from apa102_pi.driver import apa102
+from apa102_pi.driver import bytemath
+
+
+class TestAnimation(TestCase):
+    # Byte strings are mixed in bulk, with rounding
+    def test_mix(self):
+        first, second = bytes([0, 255, 100, 7]), bytes([255, 0, 200, 7])
+        for weight in (0, 1, 64, 128, 255, 256):
+            expected = bytes((a * (256 - weight) + b * weight + 128) >> 8 for a, b in zip(first, second))
+            self.assertEqual(bytemath.mix(bytemath.lanes(first), bytemath.lanes(second), weight, 4), expected)
+
+    # The colors are interpolated between the keyframes
+    def test_keyframes(self):
+        strip = apa102.APA102(num_led=2, bus_method='null')
+        movie = animation.Animation(strip)
+        with self.assertRaises(ValueError):
+            movie.add_keyframe(0.0, bytes(3))
+        with self.assertRaises(ValueError):
+            movie.add_keyframe(0.0, bytes(6), easing='bounce')
+        movie.add_keyframe(2.0, bytes([200, 0, 0, 0, 0, 200]), easing='ease-in')
+        movie.add_keyframe(0.0, bytes(6))
+        movie.add_keyframe(1.0, bytes([100, 0, 0, 0, 0, 100]))
+        self.assertEqual(movie.duration, 2.0)
+        self.assertEqual(movie.frame_at(-1.0), bytes(6))
+        self.assertEqual(movie.frame_at(0.5), bytes([50, 0, 0, 0, 0, 50]))
+        self.assertEqual(movie.frame_at(1.5), bytes([125, 0, 0, 0, 0, 125]))  # A quarter of the way, eased in
+        self.assertEqual(movie.frame_at(9.0), bytes([200, 0, 0, 0, 0, 200]))
+        movie.loop = True
+        self.assertEqual(movie.frame_at(2.5), bytes([50, 0, 0, 0, 0, 50]))
+        movie.render(1.0)
+        self.assertEqual(strip.get_pixel_rgb(1)["rgb_color"], 0x000064)
+
+    # HSV goes around the color wheel instead of through gray
+    def test_hsv(self):
+        strip = apa102.APA102(num_led=1, bus_method='null')
+        movie = animation.Animation(strip, hsv_steps=4)
+        movie.add_keyframe(0.0, bytes([255, 0, 0]))
+        movie.add_keyframe(1.0, bytes([0, 255, 0]), interpolation='hsv')
+        self.assertEqual(movie.frame_at(0.5), bytes([255, 255, 0]))
+        self.assertEqual(movie.frame_at(1.0), bytes([0, 255, 0]))
+        self.assertEqual(movie.frame_at(0.125), bytes([255, 64, 0]))  # Half way to the first step
@@ -1,29 +1,105 @@
 """Very rudimentary test class, might get extended in the future"""
-from unittest import TestCase
+import subprocess
+import sys
+from array import array
+from unittest import TestCase, mock, skipIf
 
-import apa102
+from apa102_pi.driver import apa102
+from apa102_pi.driver import colorcycletemplate
+from apa102_pi.driver import correction
+from apa102_pi.driver import framestats
+from apa102_pi.driver import transport
+
+
+class Recorder:
+    """Stands in for an SPI device, and remembers everything that is written to it"""
+
+    def __init__(self):
+        self.writes = []
+        self.locked = False
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def try_lock(self):
+        if self.locked:
+            return False
+        self.locked = True
+        return True
+
+    def unlock(self):
+        if not self.locked:
+            raise ValueError("Not locked")
+        self.locked = False
+
+    def configure(self, baudrate):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class Blink(colorcycletemplate.ColorCycleTemplate):
+    """Turns all LEDs on and off, and shows nothing in skip_steps"""
+
+    def __init__(self, num_led, skip_steps=(), **kwargs):
+        super().__init__(num_led, **kwargs)
+        self.skip_steps = skip_steps
+
+    def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
+        if current_step in self.skip_steps:
+            return 0
+        strip.fill(0xFFFFFF if current_step % 2 else 0)
+        return 1
 
 
 class TestAPA102(TestCase):
     # Check num_led
     def test_check_init(self):
         with self.assertRaises(ValueError):
-            apa102.APA102(num_led=-1)
-        with self.assertRaises(ValueError):
-            apa102.APA102(num_led=0)
+            apa102.APA102(num_led=-1, bus_method='null')
         with self.assertRaises(ValueError):
-            apa102.APA102(num_led=1025)
+            apa102.APA102(num_led=0, bus_method='null')
         try:
-            apa102.APA102(num_led=1)
+            apa102.APA102(num_led=1, bus_method='null')
         except ValueError:
             self.fail("num_led 1 should be valid")
         try:
-            apa102.APA102(num_led=1024)
+            apa102.APA102(num_led=1024, bus_method='null')
         except ValueError:
             self.fail("num_led 1024 should be valid")
+        try:
+            apa102.APA102(num_led=5000, bus_method='null')
+        except ValueError:
+            self.fail("num_led 5000 should be valid")
+        # Check order and global_brightness
+        with self.assertRaises(ValueError):
+            apa102.APA102(order='rgw', bus_method='null')
+        with self.assertRaises(ValueError):
+            apa102.APA102(global_brightness=32, bus_method='null')
+        with self.assertRaises(ValueError):
+            apa102.APA102(global_brightness=-1, bus_method='null')
         # Check bus_method
         with self.assertRaises(ValueError):
             apa102.APA102(bus_method='invalid')
+        try:
+            apa102.APA102(bus_method='NULL')
+        except ValueError:
+            self.fail("null should be valid")
+        # Check bitbang
+        with self.assertRaises(ValueError):
+            apa102.APA102(bus_method='bitbang')
+        with self.assertRaises(ValueError):
+            apa102.APA102(bus_method='bitbang', mosi=25, sclk=25)
+        # Check spidev
+        with self.assertRaises(ValueError):
+            apa102.APA102(bus_method='spidev', ce=7)
+        with self.assertRaises(ValueError):
+            apa102.APA102(bus_method='spidev', lock_timeout=1.0)
+
+    # Check the bus and the pins
+    @skipIf(transport.hardware_error() is not None, "Needs a Raspberry Pi")
+    def test_check_hardware(self):
         try:
             apa102.APA102(bus_method='spi')
         except ValueError:
@@ -39,8 +115,271 @@ class TestAPA102(TestCase):
             apa102.APA102(bus_method='spi', spi_bus=0)
         except ValueError:
             self.fail("bus 0 should exist")
-        # Check bitbang
+
+    # Check the pixel buffer
+    def test_pixel_buffer(self):
+        strip = apa102.APA102(num_led=3, order='rgb', global_brightness=31, bus_method='null')
+        strip.set_pixel_rgb(1, 0x102030)
+        self.assertEqual(bytes(strip.leds[4:8]), bytes([0xFF, 0x30, 0x20, 0x10]))
+        self.assertEqual(strip.get_pixel_rgb(1)["rgb_color"], 0x102030)
+        # Writes into the view end up in the frame that is sent to the strip
+        strip.leds[8:12] = bytes([0xE1, 1, 2, 3])
+        self.assertEqual(strip.get_pixel(2)["red"], 3)
+        self.assertEqual(bytes(strip.frame[12:16]), bytes([0xE1, 1, 2, 3]))
+        strip.rotate()
+        self.assertEqual(strip.get_pixel_rgb(0)["rgb_color"], 0x102030)
+
+    # Check the bulk pixel methods
+    def test_bulk_pixels(self):
+        strip = apa102.APA102(num_led=4, order='grb', global_brightness=31, bus_method='null')
+        strip.fill(0x010203)
+        self.assertEqual(bytes(strip.leds), bytes([0xFF, 3, 1, 2]) * 4)
+        strip.set_range(1, 10, 0x000000)
+        self.assertEqual(strip.get_pixel_rgb(0)["rgb_color"], 0x010203)
+        self.assertEqual(strip.get_pixel_rgb(3)["rgb_color"], 0)
+        strip.set_pixels(bytes([1, 2, 3, 4, 5, 6, 7, 8, 9]), start=2)
+        self.assertEqual(strip.get_pixel_rgb(2)["rgb_color"], 0x010203)
+        self.assertEqual(strip.get_pixel_rgb(3)["rgb_color"], 0x040506)
+        strip.set_pixels(bytes([9, 9, 9, 1, 1, 1]), start=-1)
+        self.assertEqual(strip.get_pixel_rgb(0)["rgb_color"], 0x010101)
+
+    # Check that long frames are split into several writes
+    def test_long_frame(self):
+        recorder = transport.NullTransport(record=True, max_transfer=4096)
+        strip = apa102.APA102(num_led=3000, transport=recorder)
+        self.assertEqual(len(strip.frame), 4 + 4 * 3000 + 4 + 188)
+        strip.show()
+        self.assertEqual(recorder.transfer_count, 3)
+        self.assertEqual(recorder.frames, [bytes(strip.frame)])
+
+    # Check that unchanged frames are not sent again
+    def test_skip_unchanged(self):
+        recorder = transport.NullTransport(record=True)
+        strip = apa102.APA102(num_led=40, partial_update=True, transport=recorder)
+        strip.fill(0)
+        strip.show()
+        self.assertEqual(len(recorder.frames[-1]), len(strip.frame))
+        strip.show()
+        self.assertEqual(len(recorder.frames), 1)
+        strip.fill(0)  # Same as before
+        strip.show()
+        self.assertEqual(len(recorder.frames), 1)
+        strip.set_pixel(4, 255, 0, 0)
+        strip.show()
+        # Start frame and 5 LEDs, then reset frame and the end frame for 5 LEDs
+        self.assertEqual(recorder.frames[1], bytes(strip.frame[:24]) + bytes(5))
+        strip.show(force=True)
+        self.assertEqual(recorder.frames[-1], bytes(strip.frame))
+
+    # Check the lookup tables
+    def test_tables(self):
+        strip = apa102.APA102(num_led=2, order='rgb', global_brightness=31, bus_method='null')
+        for wheel_pos in range(256):
+            self.assertEqual(strip.wheel(wheel_pos), apa102.wheel_color(wheel_pos))
+        strip.set_pixels_wheel([0, 85])
+        self.assertEqual(strip.get_pixel_rgb(1)["rgb_color"], 0xFF0000)
+        strip.set_global_brightness(2)
+        strip.set_order('bgr')
+        strip.set_pixels_wheel([85])
+        self.assertEqual(bytes(strip.leds[:4]), bytes([0xE2, 0xFF, 0, 0]))
+        strip.set_pixel_rgb(0, 0, 50)
+        self.assertEqual(strip.leds[0], 0xE1)
+
+    # Check the background transmit thread
+    def test_threaded(self):
+        recorder = transport.NullTransport(record=True)
+        strip = apa102.APA102(num_led=10, threaded=True, queue_depth=2, transport=recorder)
+        for color in range(5):
+            strip.fill(color)
+            strip.show()
+        strip.flush()
+        self.assertEqual(len(recorder.frames), 5)
+        self.assertEqual(recorder.frames[-1], bytes(strip.frame))
+        strip.cleanup()
+        self.assertIsNone(strip.transmit_thread)
+        self.assertEqual(recorder.frames[-1][4:8], bytes([0xE4, 0, 0, 0]))
+
+    # Check waiting for the bus lock
+    def test_lock_timeout(self):
+        recorder = Recorder()
+        bus = transport.BusioTransport(recorder, use_lock=True, lock_timeout=0.05)
+        strip = apa102.APA102(num_led=10, transport=bus)
+        strip.show()
+        self.assertFalse(recorder.locked)
+        self.assertEqual(bus.lock_waits, 0)
+        recorder.locked = True  # Someone else holds the bus
+        with self.assertRaises(TimeoutError):
+            strip.show()
+        self.assertEqual(bus.lock_waits, 1)
+        self.assertGreaterEqual(bus.lock_wait_time, 0.05)
+        self.assertEqual(len(recorder.writes), 1)
+
+    # Check the frame timing statistics
+    def test_stats(self):
+        stats = framestats.FrameStats(window=10)
+        frames = []
+        stats.add_hook(frames.append)
+        strip = apa102.APA102(num_led=10, bus_method='null', stats=stats)
+        for _ in range(20):
+            stats.record('render', 0.001)
+            strip.show()
+        self.assertEqual(stats.frame_count, 20)
+        self.assertEqual(len(stats.timings['transmit']), 10)
+        self.assertEqual(sorted(frames[-1]), ['encode', 'lock', 'render', 'transmit'])
+        self.assertEqual(stats.histogram('render')[3], 10)  # 1 ms is in the bucket from 0.5 to 1 ms
+        self.assertGreater(stats.fps(), 0)
+        self.assertAlmostEqual(stats.summary()['stages']['render']['p95'], 0.001)
+
+    # With a threaded strip, lock and transmit are recorded into the frame they belong to
+    def test_threaded_stats(self):
+        stats = framestats.FrameStats()
+        frames = []
+        stats.add_hook(frames.append)
+        strip = apa102.APA102(num_led=10, threaded=True, stats=stats,
+                              transport=transport.NullTransport(bus_speed_hz=100000))
+        for frame in range(20):
+            stats.record('render', frame)
+            strip.show(force=True)
+        strip.flush()
+        self.assertEqual(stats.frame_count, 20)
+        self.assertEqual([frame['render'] for frame in frames], list(range(20)))
+        self.assertTrue(all(sorted(frame) == ['encode', 'lock', 'render', 'transmit'] for frame in frames))
+        self.assertEqual(stats.current, {})
+        strip.cleanup()
+
+    # The pause before a step of a color cycle is part of the frame of this step
+    def test_cycle_stats(self):
+        stats = framestats.FrameStats()
+        frames = []
+        stats.add_hook(frames.append)
+        Blink(num_led=4, num_steps_per_cycle=3, num_cycles=1, fps=100, bus_method='null', stats=stats).start()
+        # Clear and init, the three steps, then two more clears by cleanup
+        self.assertEqual(len(frames), 7)
+        self.assertEqual([sorted(frame) for frame in frames[2:5]],
+                         [['encode', 'lock', 'render', 'sleep', 'transmit']] * 3)
+        self.assertNotIn('sleep', frames[5])
+        # Steps that show nothing don't add their timings to the next frame
+        stats = framestats.FrameStats()
+        Blink(num_led=4, num_steps_per_cycle=3, num_cycles=2, fps=50, bus_method='null', stats=stats,
+              skip_steps=[1]).start()
+        self.assertEqual(stats.frame_count, 8)  # Clear, init, steps 0 and 2 twice, cleanup twice
+        self.assertLess(max(stats.timings['sleep']), 0.03)  # One frame period is 0.02 seconds
+
+    # Check that rotate only moves the offset, and all methods follow it
+    def test_rotate(self):
+        recorder = transport.NullTransport(record=True)
+        strip = apa102.APA102(num_led=5, order='bgr', global_brightness=31, transport=recorder)
+        strip.set_pixels(bytes(range(15)))
+        buffer = bytes(strip.leds)
+        strip.rotate(2)
+        self.assertEqual(bytes(strip.leds), buffer)
+        self.assertEqual(strip.get_pixel_rgb(0)["rgb_color"], 0x060708)
+        strip.show()
+        self.assertEqual(recorder.frames[-1][4:24], buffer[8:] + buffer[:8])
+        strip.set_range(2, 5, 0x0A0B0C)  # Wraps around the end of the pixel buffer
+        strip.rotate(-2)
+        self.assertEqual([strip.get_pixel_rgb(led)["rgb_color"] for led in range(5)],
+                         [0x0A0B0C, 0x0A0B0C, 0x060708, 0x090A0B, 0x0A0B0C])
+
+    # Check that the color correction is applied to the frame, but not to the pixel buffer
+    def test_correction(self):
+        recorder = transport.NullTransport(record=True)
+        strip = apa102.APA102(num_led=3, order='rgb', global_brightness=31, transport=recorder, gamma=2.0,
+                              white_balance=(1.0, 0.5, 1.0))
+        strip.set_pixel_rgb(0, 0xFF80FF)
+        strip.set_pixel_rgb(2, 0x000010)
+        self.assertEqual(strip.get_pixel_rgb(0)["rgb_color"], 0xFF80FF)
+        strip.show()
+        # Blue, green, red: 255 stays 255, 128 is 64 after the gamma and 32 after the white balance
+        self.assertEqual(recorder.frames[-1][4:8], bytes([0xFF, 0xFF, 32, 0xFF]))
+        self.assertEqual(recorder.frames[-1][12:16], bytes([0xFF, 1, 0, 0]))
+        strip.rotate()
+        strip.show()
+        self.assertEqual(recorder.frames[-1][12:16], bytes([0xFF, 0xFF, 32, 0xFF]))
+        strip.set_correction()
+        strip.show()
+        self.assertEqual(recorder.frames[-1], bytes(strip.frame[:4]) + bytes(strip.leds[4:]) +
+                         bytes(strip.leds[:4]) + bytes(5))
         with self.assertRaises(ValueError):
-            apa102.APA102(bus_method='bitbang')
+            strip.set_correction(white_balance=(1.0, 2.0, 1.0))
         with self.assertRaises(ValueError):
-            apa102.APA102(bus_method='bitbang', mosi=25, sclk=25)
+            strip.set_correction(color_temperature=100)
+        self.assertEqual(correction.correction_tables(color_temperature=correction.NEUTRAL_TEMPERATURE)[1][255],
+                         255)
+
+    # Check that 16 bit intensities are split into brightness and 8 bit color
+    def test_hdr(self):
+        strip = apa102.APA102(num_led=4, order='rgb', global_brightness=31, bus_method='null')
+        strip.set_pixels_hdr(array('H', [65535, 32768, 0, 0, 0, 0, 1000, 500, 0, 100, 200, 300]))
+        self.assertEqual(bytes(strip.leds[0:4]), bytes([0xFF, 0, 128, 255]))
+        self.assertEqual(bytes(strip.leds[4:8]), bytes([0xE0, 0, 0, 0]))
+        # 1000 needs brightness 1 of 31, where 1000 * 31 / 257 is 121
+        self.assertEqual(bytes(strip.leds[8:12]), bytes([0xE1, 0, 60, 121]))
+        self.assertEqual(bytes(strip.leds[12:16]), bytes([0xE1, 36, 24, 12]))
+        strip.set_global_brightness(4)
+        strip.set_pixels_hdr(array('H', [65535, 0, 0, 16383, 0, 0]), start=-1)
+        self.assertEqual(bytes(strip.leds[0:4]), bytes([0xE1, 0, 0, 255]))
+
+    # Check that the fractions of the corrected colors are spread over several frames
+    def test_dither(self):
+        recorder = transport.NullTransport(record=True)
+        strip = apa102.APA102(num_led=2, order='rgb', global_brightness=31, transport=recorder, gamma=2.0,
+                              dither=True, dither_min_fps=0, skip_unchanged=True)
+        strip.fill(0x0B0B0B)  # 11 is 0.47 after the gamma, which rounds to 0
+        for _ in range(100):
+            strip.show()
+        self.assertEqual(len(recorder.frames), 100)
+        # On average 0.47, depending on the remainder the LED starts with
+        self.assertAlmostEqual(sum(frame[7] for frame in recorder.frames), 47, delta=1)
+        self.assertAlmostEqual(sum(frame[11] for frame in recorder.frames), 47, delta=1)
+        # Not fast enough: The colors are rounded
+        strip.dither_min_fps = 1e9
+        strip.show(force=True)
+        self.assertEqual(recorder.frames[-1][4:12], bytes([0xFF, 0, 0, 0]) * 2)
+
+    # Check that taking a snapshot of the frame does not count as showing it
+    def test_encoded_frame(self):
+        recorder = transport.NullTransport(record=True)
+        strip = apa102.APA102(num_led=2, order='rgb', transport=recorder, skip_unchanged=True, gamma=2.0,
+                              dither=True, dither_min_fps=0)
+        strip.fill(0x0B0B0B)
+        remainders = bytes(strip.dither_error)
+        frame = strip.encoded_frame()
+        self.assertEqual(bytes(strip.dither_error), remainders)
+        self.assertEqual(recorder.frames, [])
+        strip.show()
+        self.assertEqual(recorder.frames, [frame])
+
+    # Check that the hardware modules are only imported by the transports that need them
+    def test_lazy_imports(self):
+        script = ("import sys\n"
+                  "from apa102_pi.driver import apa102, transport\n"
+                  "apa102.APA102(num_led=10, transport=transport.NullTransport())\n"
+                  "print(sorted({'board', 'busio', 'digitalio', 'adafruit_bitbangio'} & set(sys.modules)))\n")
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+        self.assertEqual(result.stderr, '')  # Nothing logged either
+
+    # Check that pins are resolved from the board, and unknown ones are refused
+    @skipIf(transport.hardware_error() is not None, "Needs a Raspberry Pi")
+    def test_board_pin(self):
+        import board
+        self.assertIs(transport.board_pin(18), board.D18)
+        self.assertIs(transport.board_pin('18'), board.D18)
+        with self.assertRaises(ValueError):
+            transport.board_pin(999)
+        with self.assertRaises(ValueError):
+            transport.board_pin('D18')
+
+    # Check that a missing hardware module raises a fresh error every time
+    def test_hardware_module(self):
+        errors = []
+        with mock.patch.dict(transport.hardware_modules):  # Don't leave the module behind in the cache
+            for _ in range(2):
+                try:
+                    transport.hardware_module('no_such_blinka_module')
+                except ImportError as error:
+                    errors.append(error)
+        self.assertNotIn('no_such_blinka_module', transport.hardware_modules)
+        self.assertIsNot(errors[0], errors[1])
+        self.assertIs(errors[0].__cause__, errors[1].__cause__)
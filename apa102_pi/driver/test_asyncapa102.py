@@ -0,0 +1,86 @@
+"""Tests for the asyncio driver and effect runner"""
+import asyncio
+from unittest import TestCase
+
+from apa102_pi.driver import asyncapa102
+from apa102_pi.driver import colorcycletemplate
+from apa102_pi.driver import transport
+
+OFF = bytes([0xE4, 0, 0, 0])
+ON = bytes([0xE4, 0x30, 0x20, 0x10])  # 0x102030 with order rgb: Blue first on the wire
+UNSET = bytes([0xE0, 0, 0, 0])  # Never set since the strip was created
+
+
+def frame(*leds):
+    """Returns the frame of a 2 LED strip, as the NullTransport records it"""
+    return bytes(4) + b''.join(leds) + bytes(5)
+
+
+class Steps(colorcycletemplate.ColorCycleTemplate):
+    """Lights the LED of the current step, and remembers the calls of init and shutdown"""
+
+    periodic = True
+    initialized = False
+    finished = False
+
+    def init(self, strip, num_led):
+        self.initialized = True
+
+    def shutdown(self, strip, num_led):
+        self.finished = True
+
+    def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
+        strip.fill(0)
+        strip.set_pixel_rgb(current_step, 0x102030)
+        return 1
+
+
+class TestAsyncAPA102(TestCase):
+    # The pixel methods are the ones of the strip, the transfers are coroutines
+    def test_driver(self):
+        recorder = transport.NullTransport(record=True)
+        strip = asyncapa102.AsyncAPA102(num_led=2, order='rgb', bus_method='null', transport=recorder)
+
+        async def run():
+            strip.set_pixel_rgb(0, 0x102030)
+            self.assertEqual(strip.get_pixel_rgb(0)['rgb_color'], 0x102030)
+            await strip.show()
+            await strip.show_frame(frame(OFF, ON))
+            await strip.clear_strip()
+            await strip.cleanup()
+
+        asyncio.run(run())
+        self.assertEqual(strip.num_led, 2)
+        self.assertEqual(recorder.frames, [frame(ON, UNSET), frame(OFF, ON), frame(OFF, OFF), frame(OFF, OFF)])
+        self.assertTrue(recorder.closed)
+
+    # The color cycle plays the same frames with and without the scheduler and the cache
+    def test_start_async(self):
+        expected = [frame(OFF, OFF), frame(OFF, OFF)] + [frame(ON, OFF), frame(OFF, ON)] * 2 + [frame(OFF, OFF)]
+        for options in ({}, {'fps': 200}, {'cache_frames': True}):
+            recorder = transport.NullTransport(record=True)
+            cycle = Steps(num_led=2, num_steps_per_cycle=2, num_cycles=2, order='rgb', bus_method='null',
+                          transport=recorder, **options)
+            asyncio.run(cycle.start_async())
+            self.assertEqual(recorder.frames, expected, options)
+            self.assertTrue(cycle.initialized and cycle.finished)
+            self.assertTrue(recorder.closed)
+
+    # Cancelling the task still shuts down the color cycle, and releases the strip
+    def test_cancel(self):
+        recorder = transport.NullTransport(record=True)
+        cycle = Steps(num_led=2, pause_value=10, num_steps_per_cycle=2, order='rgb', bus_method='null',
+                      transport=recorder)
+
+        async def run():
+            task = asyncio.create_task(cycle.start_async())
+            while recorder.frame_count < 3:  # Wait for the first step, then it pauses
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(asyncio.wait_for(run(), 5))
+        self.assertTrue(cycle.finished)
+        self.assertTrue(recorder.closed)
+        self.assertEqual(recorder.frames[-1], frame(OFF, OFF))
@@ -0,0 +1,71 @@
+"""Tests for the layered compositor"""
+from unittest import TestCase, mock
+
+from apa102_pi.driver import colorcycletemplate
+from apa102_pi.driver import compositor
+from apa102_pi.driver import transport
+
+
+class Paint(colorcycletemplate.ColorCycleTemplate):
+    """Paints fixed colors once, optionally with a brightness"""
+
+    def __init__(self, num_led, pixels, bright_percent=100):
+        super().__init__(num_led)
+        self.pixels = pixels
+        self.bright_percent = bright_percent
+        self.updates = 0
+
+    def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
+        self.updates += 1
+        strip.set_pixels(self.pixels, bright_percent=self.bright_percent)
+        return 1
+
+
+class Chaser(colorcycletemplate.ColorCycleTemplate):
+    """One LED that wanders along the strip"""
+
+    def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
+        strip.fill(0)
+        strip.set_pixel_rgb(current_step, 0x808080)
+        return 1
+
+
+class TestCompositor(TestCase):
+    def compose(self, *layers):
+        recorder = transport.NullTransport()
+        mixer = compositor.Compositor(2, layers=layers, transport=recorder)
+        strip = mixer.create_strip()
+        mixer.update(strip, 2, 100, 0, 0)
+        return [strip.get_pixel_rgb(led)["rgb_color"] for led in range(2)]
+
+    # Check the blend modes
+    def test_blend(self):
+        base = bytes([200, 100, 0, 10, 20, 30])
+        top = bytes([100, 200, 50, 0, 0, 0])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha')), [0xC86400, 0x0A141E])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha'), (Paint(2, top), 'alpha')), [0x64C832, 0])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha'), (Paint(2, top), 'alpha', 0.5)), [0x969619, 0x050A0F])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha'), (Paint(2, top, 50), 'alpha')), [0x94981A, 0x050A0E])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha'), (Paint(2, top), 'add')), [0xFFFF32, 0x0A141E])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha'), (Paint(2, top), 'max')), [0xC8C832, 0x0A141E])
+        self.assertEqual(self.compose((Paint(2, base), 'alpha'), (Paint(2, top), 'multiply')), [0x4E4E00, 0])
+        with self.assertRaises(ValueError):
+            compositor.Compositor(2, layers=[(Paint(2, base), 'screen')])
+        with self.assertRaises(ValueError):
+            compositor.Compositor(3, layers=[(Paint(2, base), 'alpha')])
+
+    # Unchanged layers are not blended again
+    def test_changed_layers(self):
+        recorder = transport.NullTransport(record=True)
+        mixer = compositor.Compositor(4, num_steps_per_cycle=4, num_cycles=2, order='rgb', transport=recorder)
+        mixer.add_layer(Paint(4, bytes([0, 0, 64]) * 4))
+        mixer.add_layer(Chaser(4, num_steps_per_cycle=4), 'max')
+        with mock.patch.object(compositor.Layer, 'compose', autospec=True,
+                               side_effect=compositor.Layer.compose) as compose:
+            mixer.start()
+        composites = [call.args[0].effect for call in compose.call_args_list]
+        # The first layer is blended once, the chaser on every frame
+        self.assertEqual(composites.count(mixer.layers[0].effect), 1)
+        self.assertEqual(composites.count(mixer.layers[1].effect), 8)
+        # Clear, init, then step 0 and step 1: The chaser is on LED 1
+        self.assertEqual(recorder.frames[3][4:12], bytes([0xE4, 0x40, 0, 0, 0xE4, 0x80, 0x80, 0x80]))
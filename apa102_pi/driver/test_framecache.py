@@ -0,0 +1,77 @@
+"""Tests for the frame cache"""
+import os
+import tempfile
+from unittest import TestCase
+
+from apa102_pi.driver import apa102
+from apa102_pi.driver import colorcycletemplate
+from apa102_pi.driver import framecache
+from apa102_pi.driver import multistrip
+from apa102_pi.driver import transport
+
+
+class Steps(colorcycletemplate.ColorCycleTemplate):
+    """Lights the LED of the current step, and counts the calls of update"""
+
+    periodic = True
+    updates = 0
+
+    def update(self, strip, num_led, num_steps_per_cycle, current_step, current_cycle):
+        self.updates += 1
+        strip.fill(0)
+        strip.set_pixel_rgb(current_step, 0x102030)
+        return 1
+
+
+class TestFrameCache(TestCase):
+    # The least recently used frames are evicted first
+    def test_lru(self):
+        cache = framecache.FrameCache(max_bytes=10)
+        cache.put(1, b'1111')
+        cache.put(2, b'2222')
+        self.assertEqual(cache.get(1), b'1111')
+        cache.put(3, b'3333')
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), b'1111')
+        self.assertEqual(cache.get(3), b'3333')
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    # Evicted frames are moved to the spill file
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = framecache.FrameCache(max_bytes=10, spill_file=os.path.join(directory, 'frames'),
+                                          spill_bytes=12)
+            for key in range(5):
+                cache.put(key, bytes([key]) * 4)
+            self.assertEqual(len(cache), 5)
+            self.assertEqual(cache.get(0), bytes(4))
+            self.assertEqual(cache.get(2), bytes([2]) * 4)
+            self.assertEqual(cache.get(4), bytes([4]) * 4)
+            cache.put(5, bytes([5]) * 4)  # The spill file is full: 3 is dropped
+            self.assertIsNone(cache.get(3))
+            cache.close()
+            self.assertFalse(os.path.exists(os.path.join(directory, 'frames')))
+
+    # A periodic color cycle is rendered once, and then replayed
+    def test_replay(self):
+        frames = []
+        for cache_frames in (False, True):
+            recorder = transport.NullTransport(record=True)
+            cycle = Steps(num_led=4, num_steps_per_cycle=4, num_cycles=3, transport=recorder,
+                          cache_frames=cache_frames)
+            cycle.start()
+            frames.append(recorder.frames)
+            self.assertEqual(cycle.updates, 4 if cache_frames else 12)
+        self.assertEqual(frames[0], frames[1])
+
+    # Strips that can't replay frames, or change them on every show, are rendered as usual
+    def test_not_cached(self):
+        outputs = [apa102.APA102(num_led=2, transport=transport.NullTransport(record=True)) for _ in range(2)]
+        cycle = Steps(num_led=4, num_steps_per_cycle=4, num_cycles=2, strip=multistrip.MultiStrip(outputs),
+                      cache_frames=True)
+        self.assertIsNone(cycle.create_cache(cycle.strip))
+        cycle.start()
+        self.assertEqual(cycle.updates, 8)
+        self.assertEqual(outputs[1].transport.frames[2], outputs[1].transport.frames[6])
+        dithered = apa102.APA102(num_led=4, transport=transport.NullTransport(), gamma=2.2, dither=True)
+        self.assertIsNone(cycle.create_cache(dithered))
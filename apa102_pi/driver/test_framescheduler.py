@@ -0,0 +1,60 @@
+"""Tests for the frame scheduler"""
+import time
+from unittest import TestCase, mock
+
+from apa102_pi.driver import framescheduler
+
+
+class TestFrameScheduler(TestCase):
+    # Check the input values
+    def test_check_init(self):
+        with self.assertRaises(ValueError):
+            framescheduler.FrameScheduler(0)
+        with self.assertRaises(ValueError):
+            framescheduler.FrameScheduler(50, late_policy='invalid')
+
+    # The time spent rendering is subtracted from the pause
+    def test_steady_rate(self):
+        scheduler = framescheduler.FrameScheduler(20)
+        scheduler.start()
+        for _ in range(5):
+            time.sleep(0.025)  # Rendering takes half of the frame period
+            self.assertEqual(scheduler.wait(), 1)
+        self.assertAlmostEqual(time.monotonic(), scheduler.deadline(5), delta=0.02)
+
+    # Late frames are skipped or caught up
+    def test_late_frames(self):
+        scheduler = framescheduler.FrameScheduler(100, late_policy='skip')
+        scheduler.start()
+        time.sleep(0.035)
+        self.assertGreaterEqual(scheduler.wait(), 3)
+        self.assertEqual(scheduler.late_frames, 1)
+        scheduler = framescheduler.FrameScheduler(100, late_policy='catchup')
+        scheduler.start()
+        time.sleep(0.035)
+        self.assertEqual([scheduler.wait() for _ in range(3)], [1, 1, 1])
+        self.assertEqual(scheduler.frame_number, 3)
+
+    # Aligned frames count from the epoch of the wall clock
+    def test_align(self):
+        scheduler = framescheduler.FrameScheduler(10, align=True)
+        first_frame = scheduler.start()
+        self.assertAlmostEqual(first_frame, time.time() * 10, delta=1.5)
+        scheduler.sleep_until(first_frame)
+        self.assertAlmostEqual(time.time() * 10 % 1, 0, delta=0.1)
+
+    # Aligned frames follow the wall clock when it drifts away from the monotonic clock
+    def test_realign(self):
+        scheduler = framescheduler.FrameScheduler(100, align=True, realign=0.0)
+        scheduler.start()
+        epoch = scheduler.epoch
+        wall_clock = time.time
+        with mock.patch.object(framescheduler.time, 'time', side_effect=lambda: wall_clock() + 0.005):
+            scheduler.next_frame()
+        self.assertAlmostEqual(epoch - scheduler.epoch, 0.005, delta=0.001)
+        scheduler = framescheduler.FrameScheduler(100, align=True)  # Every 10 seconds
+        scheduler.start()
+        epoch = scheduler.epoch
+        with mock.patch.object(framescheduler.time, 'time', side_effect=lambda: wall_clock() + 0.005):
+            scheduler.next_frame()
+        self.assertEqual(scheduler.epoch, epoch)
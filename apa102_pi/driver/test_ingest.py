@@ -0,0 +1,108 @@
+"""Tests for the network ingest server, over the loopback interface"""
+import socket
+import time
+from unittest import TestCase, mock
+
+from apa102_pi.driver import apa102
+from apa102_pi.driver import ingest
+from apa102_pi.driver import multistrip
+from apa102_pi.driver import transport
+
+
+class TestIngestServer(TestCase):
+    def setUp(self):
+        self.recorder = transport.NullTransport(record=True)
+        self.strip = apa102.APA102(num_led=6, order='rgb', global_brightness=31, transport=self.recorder)
+        self.server = ingest.IngestServer(self.strip, host='127.0.0.1', port=0, leds_per_universe=4)
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def send(self, kind, universe=0, payload=b'', flags=0):
+        self.client.sendto(ingest.HEADER.pack(ingest.MAGIC, kind, flags, universe, 0) + payload, self.server.address)
+
+    # Pixels of several universes are shown together on the sync packet
+    def test_universes(self):
+        self.send(ingest.TYPE_RGB, 0, bytes(range(1, 13)))
+        self.send(ingest.TYPE_RGB, 1, bytes(range(13, 25)))  # LEDs 4 to 7, of which 6 and 7 don't exist
+        self.send(ingest.TYPE_SYNC)
+        for _ in range(3):
+            self.assertTrue(self.server.handle_packet(1.0))
+        self.assertEqual(self.recorder.frame_count, 1)
+        self.assertEqual(self.strip.get_pixel_rgb(3)["rgb_color"], 0x0A0B0C)
+        self.assertEqual(self.strip.get_pixel_rgb(5)["rgb_color"], 0x101112)
+        self.assertFalse(self.server.handle_packet(0.01))
+
+    # LED frames are received straight into the pixel buffer, even if it wraps around
+    def test_frames(self):
+        self.strip.rotate(1)  # LED 4 is at the end of the pixel buffer, and LED 5 at its start
+        frames = bytes([0xE1, 1, 2, 3, 0xE2, 4, 5, 6, 0xE3, 7, 8, 9])
+        self.send(ingest.TYPE_FRAMES, 1, frames + bytes(8), flags=ingest.FLAG_PUSH)
+        self.assertTrue(self.server.handle_packet(1.0))
+        self.assertEqual(bytes(self.strip.leds[20:24]), frames[:4])
+        self.assertEqual(bytes(self.strip.leds[0:4]), frames[4:8])
+        self.assertEqual(self.strip.get_pixel_rgb(5)["rgb_color"], 0x060504)
+        self.assertEqual(self.recorder.frame_count, 1)
+        self.send(ingest.TYPE_FRAMES, 0, bytes([0x01, 1, 2, 3]), flags=ingest.FLAG_PUSH)  # No start bits
+        self.assertTrue(self.server.handle_packet(1.0))
+        self.assertEqual(bytes(self.strip.leds[4:8]), bytes([0xE1, 1, 2, 3]))
+        self.client.sendto(b'garbage', self.server.address)
+        self.assertTrue(self.server.handle_packet(1.0))
+        self.assertEqual(self.server.errors, 1)
+
+    # An LED that gets only part of its frame still gets the start bits, and is sent
+    def test_partial_frame(self):
+        self.strip.mark_clean()
+        self.send(ingest.TYPE_FRAMES, 0, bytes([0xE1, 1, 2, 3, 0x05, 9]))
+        self.assertTrue(self.server.handle_packet(1.0))
+        self.assertEqual(bytes(self.strip.leds[0:8]), bytes([0xE1, 1, 2, 3, 0xE5, 9, 0, 0]))
+        self.assertEqual((self.strip.dirty_low, self.strip.dirty_high), (0, 2))
+
+    # LED frames for a strip without a pixel buffer of its own are dropped, not received over and over
+    def test_frames_without_buffer(self):
+        strip = multistrip.MultiStrip([self.strip])
+        server = ingest.IngestServer(strip, host='127.0.0.1', port=0, leds_per_universe=4)
+        try:
+            self.client.sendto(ingest.HEADER.pack(ingest.MAGIC, ingest.TYPE_FRAMES, 0, 0, 0) + bytes(8),
+                               server.address)
+            self.client.sendto(ingest.HEADER.pack(ingest.MAGIC, ingest.TYPE_RGB, 0, 0, 0) + bytes([1, 2, 3]),
+                               server.address)
+            self.assertTrue(server.handle_packet(1.0))
+            self.assertEqual(server.errors, 1)
+            self.assertTrue(server.handle_packet(1.0))
+            self.assertEqual(strip.get_pixel_rgb(0)["rgb_color"], 0x010203)
+            self.assertFalse(server.handle_packet(0.01))
+        finally:
+            server.stop()
+        # A packet that fails before it is received is dropped as well
+        self.send(ingest.TYPE_FRAMES, 0, bytes(8))
+        with mock.patch.object(self.strip, 'segments', side_effect=RuntimeError("Broken")):
+            with self.assertRaises(RuntimeError):
+                self.server.handle_packet(1.0)
+        self.assertFalse(self.server.handle_packet(0.01))
+
+    # Without a sync packet, the pixels are shown after max_latency
+    def test_max_latency(self):
+        self.server.max_latency = 0.05
+        self.server.start()
+        self.send(ingest.TYPE_RGB, 0, bytes([255, 0, 0]))
+        time.sleep(0.3)
+        self.assertEqual(self.recorder.frame_count, 1)
+        self.assertEqual(self.recorder.frames[0][4:8], bytes([0xFF, 0, 0, 255]))
+
+    # A failing show is logged, and the server goes on with the next packet
+    def test_show_error(self):
+        self.server.start()
+        with mock.patch.object(self.strip, 'show', side_effect=OSError("Bus gone")), self.assertLogs(level='ERROR'):
+            self.send(ingest.TYPE_RGB, 0, bytes([255, 0, 0]), flags=ingest.FLAG_PUSH)
+            for _ in range(100):
+                if self.server.errors:
+                    break
+                time.sleep(0.01)
+        self.send(ingest.TYPE_RGB, 0, bytes([0, 255, 0]), flags=ingest.FLAG_PUSH)
+        time.sleep(0.1)
+        self.assertTrue(self.server.thread.is_alive())
+        self.assertEqual(self.server.errors, 1)
+        self.assertEqual(self.recorder.frames[-1][4:8], bytes([0xFF, 0, 255, 0]))
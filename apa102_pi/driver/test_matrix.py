@@ -0,0 +1,47 @@
+"""Tests for the matrix view"""
+from unittest import TestCase
+
+from apa102_pi.driver import apa102
+from apa102_pi.driver import matrix
+
+
+def strip(num_led):
+    return apa102.APA102(num_led=num_led, bus_method='null')
+
+
+class TestMatrix(TestCase):
+    # Check the input values
+    def test_check_init(self):
+        with self.assertRaises(ValueError):
+            matrix.Matrix(strip(6), 3, 3)
+        with self.assertRaises(ValueError):
+            matrix.Matrix(strip(6), 3, 2, rotation=45)
+        with self.assertRaises(ValueError):
+            matrix.Matrix(strip(6), 3, 2, panel_width=2)
+
+    # The layouts are compiled into the expected LED numbers
+    def test_layouts(self):
+        self.assertEqual(matrix.Matrix(strip(6), 3, 2).led_map, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(matrix.Matrix(strip(6), 3, 2, serpentine=True).led_map, [0, 1, 2, 5, 4, 3])
+        self.assertEqual(matrix.Matrix(strip(6), 3, 2, vertical=True).led_map, [0, 2, 4, 1, 3, 5])
+        self.assertEqual(matrix.Matrix(strip(6), 3, 2, rotation=180).led_map, [5, 4, 3, 2, 1, 0])
+        # Wired from the top right corner down, then the next column to the left
+        self.assertEqual(matrix.Matrix(strip(6), 3, 2, rotation=90).led_map, [4, 2, 0, 5, 3, 1])
+        # Two panels of 2x2 side by side, each one serpentine
+        self.assertEqual(matrix.Matrix(strip(8), 4, 2, serpentine=True, panel_width=2).led_map,
+                         [0, 1, 4, 5, 3, 2, 7, 6])
+        self.assertEqual(matrix.Matrix(strip(10), 4, 2, start=2, panel_width=2, panel_height=1,
+                                       panel_serpentine=True).led_map, [2, 3, 4, 5, 8, 9, 6, 7])
+
+    # A full frame is copied in one go
+    def test_blit(self):
+        led_strip = strip(7)
+        panel = matrix.Matrix(led_strip, 3, 2, serpentine=True, start=1)
+        panel.blit(bytes(range(1, 19)))
+        self.assertEqual(led_strip.get_pixel_rgb(3)['rgb_color'], 0x070809)
+        self.assertEqual(led_strip.get_pixel_rgb(4)['rgb_color'], 0x101112)
+        self.assertEqual(led_strip.get_pixel_rgb(6)['rgb_color'], 0x0A0B0C)
+        self.assertEqual(panel.get_pixel_rgb(1, 1)['rgb_color'], 0x0D0E0F)
+        self.assertEqual(led_strip.get_pixel_rgb(0)['rgb_color'], 0)
+        with self.assertRaises(ValueError):
+            panel.blit(bytes(17))
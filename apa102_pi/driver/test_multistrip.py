@@ -0,0 +1,77 @@
+"""Tests for the multi strip controller"""
+import time
+from unittest import TestCase
+
+from apa102_pi.driver import apa102
+from apa102_pi.driver import multistrip
+from apa102_pi.driver import transport
+
+
+def output(num_led, order='rgb', bus_speed_hz=None):
+    return apa102.APA102(num_led=num_led, order=order,
+                         transport=transport.NullTransport(bus_speed_hz=bus_speed_hz, record=True))
+
+
+class TestMultiStrip(TestCase):
+    # Check the input values
+    def test_check_init(self):
+        with self.assertRaises(ValueError):
+            multistrip.MultiStrip([])
+        with self.assertRaises(ValueError):
+            multistrip.MultiStrip([output(2)], mapping=[(0, 2)])
+        with self.assertRaises(ValueError):
+            multistrip.MultiStrip([output(2)], mapping=[(1, 0)])
+
+    # Logical LEDs end up on the mapped output, in the color order of the output
+    def test_mapping(self):
+        first, second = output(3), output(2, order='grb')
+        strip = multistrip.MultiStrip([first, second], mapping=[(1, 1), (0, 0), (0, 1), (0, 2), (1, 0)])
+        self.assertEqual(strip.num_led, 5)
+        self.assertEqual(len(strip.runs), 3)
+        strip.set_pixels(bytes(range(1, 16)))
+        self.assertEqual(second.get_pixel_rgb(1)['rgb_color'], 0x010203)
+        self.assertEqual(first.get_pixel_rgb(0)['rgb_color'], 0x040506)
+        self.assertEqual(first.get_pixel_rgb(2)['rgb_color'], 0x0A0B0C)
+        self.assertEqual(second.get_pixel_rgb(0)['rgb_color'], 0x0D0E0F)
+        strip.set_range(3, 5, 0xFF0000)
+        self.assertEqual(strip.get_pixel_rgb(2)['rgb_color'], 0x070809)
+        self.assertEqual(second.get_pixel(0)['red'], 0xFF)
+        strip.rotate()
+        self.assertEqual(strip.get_pixel_rgb(0)['rgb_color'], 0x040506)
+        self.assertEqual(strip.get_pixel_rgb(4)['rgb_color'], 0x010203)
+        self.assertEqual(second.get_pixel_rgb(0)['rgb_color'], 0x010203)
+
+    # LEDs move across the outputs, also if the outputs are rotated themselves
+    def test_rotate(self):
+        first, second = output(3), output(4, order='grb')
+        first.rotate(1)
+        strip = multistrip.MultiStrip([first, second])
+        colors = [0x010203 * (led + 1) for led in range(7)]
+        for led, color in enumerate(colors):
+            strip.set_pixel_rgb(led, color, bright_percent=led * 10)
+        brightness = [strip.get_pixel(led)['bright_percent'] for led in range(7)]
+        self.assertEqual(brightness, [0, 25, 25, 50, 50, 50, 75])  # With global brightness 4
+        for positions in (1, 5, -2, 9):
+            strip.rotate(positions)
+            colors = colors[positions % 7:] + colors[:positions % 7]
+            brightness = brightness[positions % 7:] + brightness[:positions % 7]
+            self.assertEqual([strip.get_pixel_rgb(led)['rgb_color'] for led in range(7)], colors)
+            self.assertEqual([strip.get_pixel(led)['bright_percent'] for led in range(7)], brightness)
+        # A single output is rotated with its ring offset
+        single = output(5)
+        multistrip.MultiStrip([single]).rotate(2)
+        self.assertEqual(single.offset, 2)
+
+    # All outputs are sent in parallel, so a frame takes as long as the longest output
+    def test_parallel_show(self):
+        outputs = [output(300, bus_speed_hz=100000) for _ in range(4)]
+        strip = multistrip.MultiStrip(outputs)
+        strip.fill(0x102030)
+        started = time.monotonic()
+        strip.show()  # About 0.1 seconds per output
+        self.assertLess(time.monotonic() - started, 0.3)
+        for strip_output in outputs:
+            self.assertEqual(strip_output.transport.frame_count, 1)
+            self.assertEqual(strip_output.transport.frames[0][4:8], b'\xe4\x30\x20\x10')
+        strip.cleanup()
+        self.assertEqual(outputs[0].transport.frame_count, 2)  # Cleared by cleanup
@@ -0,0 +1,62 @@
+"""Tests for the recorded shows"""
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from apa102_pi.driver import apa102
+from apa102_pi.driver import framescheduler
+from apa102_pi.driver import showfile
+from apa102_pi.driver import transport
+
+
+class TestShowFile(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'show.apas')
+        self.recorder = transport.NullTransport(record=True)
+        self.strip = apa102.APA102(num_led=3, transport=self.recorder)
+        self.frames = []
+        with showfile.ShowWriter(self.path, 3, fps=50) as writer:
+            for led in range(3):
+                self.strip.fill(0)
+                self.strip.set_pixel_rgb(led, 0xFF0000)
+                writer.write_strip(self.strip)
+                self.frames.append(self.strip.encoded_frame())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # The frames are played as they were recorded, with seeking and looping
+    def test_play(self):
+        with showfile.ShowPlayer(self.path, self.strip) as player:
+            self.assertEqual((player.fps, player.frame_count), (50, 3))
+            self.assertEqual(player.duration, 0.06)
+            player.play()
+            self.assertEqual(self.recorder.frames, self.frames)
+            player.seek(0.02)
+            # Never late, so that no frame is skipped
+            with mock.patch.object(framescheduler.FrameScheduler, 'wait', autospec=True,
+                                   side_effect=lambda scheduler: scheduler.next_frame()[0]):
+                player.play(loop=True, duration=0.1)
+            frames = self.frames
+            self.assertEqual(self.recorder.frames[3:], [frames[1], frames[2], frames[0], frames[1], frames[2]])
+        self.assertTrue(player.mapping.closed)
+
+    # The frame rate is kept exactly
+    def test_fps(self):
+        with showfile.ShowWriter(self.path, 3, fps=29.97) as writer:
+            writer.write_strip(self.strip)
+        with showfile.ShowPlayer(self.path, self.strip) as player:
+            self.assertEqual(player.fps, 29.97)
+
+    # Check the input values
+    def test_check_file(self):
+        with self.assertRaises(ValueError):
+            showfile.ShowPlayer(self.path, apa102.APA102(num_led=4, bus_method='null'))
+        with open(self.path, 'r+b') as show:
+            show.write(b'XXXX')
+        with self.assertRaises(ValueError):
+            showfile.ShowPlayer(self.path, self.strip)
+        with showfile.ShowWriter(self.path, 3, fps=50) as writer:
+            with self.assertRaises(ValueError):
+                writer.write_strip(apa102.APA102(num_led=4, bus_method='null'))
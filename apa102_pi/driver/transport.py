@@ -0,0 +1,338 @@
+"""The module contains the transports that carry the frames from the driver to the LED strip"""
+import fcntl
+import importlib
+import logging
+import os
+import struct
+import time
+
+# The spidev kernel driver refuses transfers larger than its buffer size (4096 bytes unless configured otherwise)
+SPIDEV_BUFSIZ = '/sys/module/spidev/parameters/bufsiz'
+DEFAULT_MAX_TRANSFER = 4096
+# While waiting for the bus lock, sleep between two attempts: Starting at 0.1 ms, doubling up to 10 ms
+LOCK_BACKOFF_MIN = 0.0001
+LOCK_BACKOFF_MAX = 0.01
+# ioctl requests of the spidev kernel driver (see linux/spi/spidev.h): Set the SPI mode and the clock speed
+SPI_IOC_WR_MODE = 0x40016B01
+SPI_IOC_WR_MAX_SPEED_HZ = 0x40046B04
+
+BUS_METHODS = ['spi', 'bitbang', 'spidev', 'null']
+
+
+def spidev_bufsiz():
+    """Returns the largest transfer the spidev kernel driver accepts."""
+    try:
+        with open(SPIDEV_BUFSIZ) as bufsiz:
+            return int(bufsiz.read())
+    except (OSError, ValueError):
+        return DEFAULT_MAX_TRANSFER
+
+
+# The Adafruit Blinka modules are imported on first use only, by the transports that need them. Importing
+# them detects the board, which takes much longer than everything else. Imported modules, and the errors
+# of the ones that failed to import, are kept here.
+hardware_modules = {}
+
+
+def hardware_module(name):
+    """Imports a module of Adafruit Blinka, e.g. board or busio, on first use.
+
+    Raises ImportError or NotImplementedError if not running on a board that Blinka supports.
+    Then, only the spidev and null transports are available.
+    """
+    module = hardware_modules.get(name)
+    if module is None:
+        try:
+            module = importlib.import_module(name)
+        except (ImportError, NotImplementedError) as error:
+            module = error
+        hardware_modules[name] = module
+    if isinstance(module, Exception):
+        # A new error each time, so that the traceback of the first one does not grow with every call
+        raise type(module)(str(module)) from module
+    return module
+
+
+def hardware_error():
+    """Returns the error why Adafruit Blinka can't be used, or None if it can."""
+    try:
+        for name in ('board', 'busio', 'digitalio', 'adafruit_bitbangio', 'microcontroller.pin'):
+            hardware_module(name)
+    except (ImportError, NotImplementedError) as error:
+        return error
+    return None
+
+
+# GPIO number to board pin, filled on first use
+pin_table = {}
+
+
+def board_pin(number):
+    """Returns the pin object of the board for a GPIO number, e.g. board.D18 for 18 or '18'."""
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        raise ValueError("Illegal pin %s not a GPIO number" % number)
+    if not pin_table:
+        board = hardware_module('board')
+        for name in dir(board):
+            if name[0] == 'D' and name[1:].isdigit():
+                pin_table[int(name[1:])] = getattr(board, name)
+    pin = pin_table.get(number)
+    if pin is None:
+        raise ValueError("Illegal pin %s not a GPIO of the board" % number)
+    return pin
+
+
+# The hardware SPI ports of the board, filled on first use
+spi_port_table = {}
+
+
+def spi_ports():
+    """Returns the hardware SPI ports of the board, with their SCLK, MOSI and MISO pins."""
+    if not spi_port_table:
+        for id_port, sclk_port, mosi_port, miso_port in hardware_module('microcontroller.pin').spiPorts:
+            spi_port_table[id_port] = {'SCLK': sclk_port, 'MOSI': mosi_port, 'MISO': miso_port}
+    return spi_port_table
+
+
+def create(bus_method='spi', spi_bus=0, mosi=None, sclk=None, ce=None, bus_speed_hz=8000000, lock_timeout=None,
+           max_transfer=None):
+    """Creates the transport for a bus method. The parameters are the ones of APA102.
+
+    :param bus_method: spi (hardware SPI), bitbang (software SPI), spidev (hardware SPI, through the
+                       kernel driver directly) or null (no LEDs, see NullTransport)
+    """
+    if bus_method == 'spi':
+        return HardwareSPITransport(spi_bus, bus_speed_hz, ce, lock_timeout, max_transfer)
+    if bus_method == 'bitbang':
+        return BitbangTransport(mosi, sclk, bus_speed_hz, ce, lock_timeout, max_transfer)
+    if bus_method == 'spidev':
+        # The kernel driver toggles CE0 itself, and there is no bus lock to wait for
+        if ce is not None:
+            raise ValueError("Illegal ce not supported by spidev, which always uses CE0")
+        if lock_timeout is not None:
+            raise ValueError("Illegal lock_timeout not supported by spidev")
+        return SpidevTransport(spi_bus, 0, bus_speed_hz, max_transfer)
+    if bus_method == 'null':
+        return NullTransport(max_transfer=max_transfer)
+    raise ValueError("Illegal bus_method not in %s" % BUS_METHODS)
+
+
+class Transport:
+    """Base class of all transports.
+
+    A transport sends frames to the strip. A frame is passed as a list of buffers,
+    which are sent one after the other, as one transaction: write calls begin, then
+    write_chunk for pieces of at most max_transfer bytes, then end. A subclass must
+    implement at least write_chunk.
+    """
+
+    def __init__(self, max_transfer=None):
+        self.max_transfer = max_transfer or spidev_bufsiz()
+        self.lock_wait_time = 0.0  # For monitoring: Total number of seconds spent waiting for the bus lock
+        self.lock_waits = 0  # For monitoring: How many times the bus lock was taken by someone else
+
+    def write(self, buffers):
+        """Sends several buffers, one after the other, in one transaction."""
+        self.begin()
+        try:
+            for data in buffers:
+                data = memoryview(data)
+                for start in range(0, len(data), self.max_transfer):
+                    self.write_chunk(data[start:start + self.max_transfer])
+        finally:
+            self.end()
+
+    def begin(self):
+        """Starts a transaction. The default does nothing."""
+        pass
+
+    def end(self):
+        """Ends a transaction. The default does nothing."""
+        pass
+
+    def write_chunk(self, data):
+        """Sends at most max_transfer bytes. It must be implemented."""
+        raise NotImplementedError("Please implement the write_chunk() method")
+
+    def close(self):
+        """Releases the bus. The default does nothing."""
+        pass
+
+
+class BusioTransport(Transport):
+    """Sends the frames through a CircuitPython SPI object, i.e. busio.SPI or bitbangio.SPI.
+
+    If a chip select pin is used, or if the bus must be locked (bitbang), the bus is
+    locked for the entire frame. The lock is acquired with a growing pause between
+    two attempts instead of spinning.
+    """
+
+    def __init__(self, spi, bus_speed_hz=8000000, chip_select=None, use_lock=False, lock_timeout=None,
+                 max_transfer=None):
+        """Initializes the transport
+
+        :param spi: The SPI object
+        :param bus_speed_hz: Speed of the bus
+        :param chip_select: A digitalio.DigitalInOut to pull low during every transfer, or None
+        :param use_lock: Lock the bus during every transfer, even without chip select
+        :param lock_timeout: How many seconds to wait for the bus lock before giving up with a TimeoutError.
+                   Default is to wait forever.
+        :param max_transfer: Largest number of bytes written to the SPI object at once.
+        """
+        super().__init__(max_transfer)
+        self.spi = spi
+        self.bus_speed_hz = bus_speed_hz
+        self.chip_select = chip_select
+        self.use_lock = use_lock or chip_select is not None
+        self.lock_timeout = lock_timeout
+        if chip_select is not None:
+            chip_select.switch_to_output(value=True)
+        else:
+            # Without chip select, the bus speed is set once here. Otherwise, it is set on every transfer
+            self.acquire_bus()
+            self.spi.configure(baudrate=bus_speed_hz)
+            self.spi.unlock()
+
+    def begin(self):
+        if self.use_lock:
+            self.acquire_bus()
+            if self.chip_select is not None:
+                self.spi.configure(baudrate=self.bus_speed_hz)
+                self.chip_select.value = False
+
+    def end(self):
+        if self.use_lock:
+            if self.chip_select is not None:
+                self.chip_select.value = True
+            self.spi.unlock()
+
+    def write_chunk(self, data):
+        self.spi.write(data)
+
+    def acquire_bus(self):
+        """Locks the SPI bus.
+
+        If someone else (e.g. another thread) holds the lock, sleep between two attempts
+        instead of spinning, with a growing pause. Gives up with a TimeoutError after
+        lock_timeout seconds. The time spent waiting is added to lock_wait_time.
+        """
+        if self.spi.try_lock():
+            return  # The usual case: Nobody else uses the bus
+        started = time.monotonic()
+        backoff = LOCK_BACKOFF_MIN
+        try:
+            while not self.spi.try_lock():
+                if self.lock_timeout is not None and time.monotonic() - started >= self.lock_timeout:
+                    raise TimeoutError("Could not lock the SPI bus within %s seconds" % self.lock_timeout)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, LOCK_BACKOFF_MAX)
+        finally:
+            self.lock_waits += 1
+            self.lock_wait_time += time.monotonic() - started
+
+    def close(self):
+        # Try to unlock, in case it is still locked
+        try:
+            self.spi.unlock()
+        except ValueError:
+            # Do nothing, the bus was not locked
+            pass
+        self.spi.deinit()  # Close SPI port
+
+    @staticmethod
+    def chip_select_pin(ce):
+        """Returns the chip select GPIO as a digitalio object, or None if ce is None."""
+        if ce is None:
+            return None
+        return hardware_module('digitalio').DigitalInOut(board_pin(ce))
+
+
+class HardwareSPITransport(BusioTransport):
+    """Hardware SPI through Adafruit Blinka (busio)."""
+
+    def __init__(self, spi_bus=0, bus_speed_hz=8000000, ce=None, lock_timeout=None, max_transfer=None):
+        ports = spi_ports()
+        if spi_bus not in ports:
+            raise ValueError("Illegal spi_bus not in %s" % list(ports))
+        selected = ports[spi_bus]
+        spi = hardware_module('busio').SPI(clock=selected['SCLK'], MOSI=selected['MOSI'])
+        super().__init__(spi, bus_speed_hz,
+                         self.chip_select_pin(ce), False, lock_timeout, max_transfer)
+        if ce is not None:
+            logging.debug("Use software chip enable")
+        logging.debug("Use hardware SPI")
+
+
+class BitbangTransport(BusioTransport):
+    """Software SPI on any two GPIO pins (bitbangio)."""
+
+    def __init__(self, mosi, sclk, bus_speed_hz=8000000, ce=None, lock_timeout=None, max_transfer=None):
+        spi = hardware_module('adafruit_bitbangio').SPI(clock=board_pin(sclk), MOSI=board_pin(mosi))
+        super().__init__(spi, bus_speed_hz, self.chip_select_pin(ce), True, lock_timeout, max_transfer)
+        if ce is not None:
+            logging.debug("Use software chip enable")
+        logging.debug("Use bitbang SPI")
+
+
+class SpidevTransport(Transport):
+    """Hardware SPI through the spidev kernel driver, without Adafruit Blinka.
+
+    Writes go straight to /dev/spidev<bus>.<device>, with the clock speed set by ioctl.
+    This has the least overhead per frame. Note that the kernel driver toggles the
+    hardware chip select line CE0 (device 0) or CE1 (device 1).
+    """
+
+    def __init__(self, spi_bus=0, device=0, bus_speed_hz=8000000, max_transfer=None):
+        super().__init__(max_transfer)
+        self.fd = os.open('/dev/spidev%d.%d' % (spi_bus, device), os.O_RDWR)
+        fcntl.ioctl(self.fd, SPI_IOC_WR_MODE, struct.pack('=B', 0))
+        fcntl.ioctl(self.fd, SPI_IOC_WR_MAX_SPEED_HZ, struct.pack('=I', bus_speed_hz))
+        logging.debug("Use spidev")
+
+    def write_chunk(self, data):
+        os.write(self.fd, data)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class NullTransport(Transport):
+    """A transport without LEDs, for tests and benchmarks on any computer.
+
+    It counts the frames and bytes that would have been sent. If record is true, it
+    also keeps a copy of every frame in frames. If bus_speed_hz is set, it simulates
+    the time the transfer would take on a real bus of this speed by sleeping.
+    """
+
+    def __init__(self, bus_speed_hz=None, record=False, max_transfer=None):
+        super().__init__(max_transfer)
+        self.bus_speed_hz = bus_speed_hz
+        self.record = record
+        self.frames = []  # With record: One bytes object per frame
+        self.frame_count = 0
+        self.transfer_count = 0
+        self.bytes_sent = 0
+        self.current = None
+        self.closed = False
+
+    def begin(self):
+        self.current = [] if self.record else None
+
+    def end(self):
+        self.frame_count += 1
+        if self.current is not None:
+            self.frames.append(b''.join(self.current))
+            self.current = None
+
+    def write_chunk(self, data):
+        self.transfer_count += 1
+        self.bytes_sent += len(data)
+        if self.current is not None:
+            self.current.append(bytes(data))
+        if self.bus_speed_hz:
+            time.sleep(8 * len(data) / self.bus_speed_hz)
+
+    def close(self):
+        self.closed = True